@@ -116,7 +116,7 @@ def t_error(t):
 
 # Create the lexer
 
-lexer = lex.lex()
+lexer = lex.lex(cachefile='scanner.lextab')
 
 def set_source(text):
     """Load some source code directly into the lexer"""
@@ -92,7 +92,7 @@ def __create_lexer():
         print_at(t, f'Warning: skipping illegal character: {t.value[0]}')
         t.lexer.skip(1)
 
-    return extend_lexer(lex.lex())
+    return extend_lexer(lex.lex(cachefile='tac.lextab'))
 
 # ------------------------------------------------------------------------------
 
@@ -132,7 +132,7 @@ def __create_parser():
             print_at(p, f'Error: syntax error at token {p.type}')
         raise RuntimeError('parsing')
 
-    return yacc.yacc(start='program')
+    return yacc.yacc(start='program', tabfile='tac.parsetab')
 
 # ------------------------------------------------------------------------------
 
@@ -221,11 +221,18 @@ def execute(prog, *, show_instr=False, only_decimal=True):
 
 # --------------------------------------------------------------------------------
 
-lexer  = __create_lexer()
-parser = __create_parser()
+lexer = None
+parser = None
+
+def _init_parser():
+    """Create the module-level `lexer' and `parser' on first use"""
+    global lexer, parser
+    if lexer is None: lexer = __create_lexer()
+    if parser is None: parser = __create_parser()
 
 def load_tac(tac_file):
     """Load the TAC instructions from the given `tac_file'"""
+    _init_parser()
     lexer.load_source(tac_file)
     return parser.parse(lexer=lexer)
 
@@ -94,7 +94,7 @@ def create_lexer():
         print_at(t, f'Warning: skipping illegal character {t.value[0]}')
         t.lexer.skip(1)
 
-    return extend_lexer(lex.lex())
+    return extend_lexer(lex.lex(cachefile='bx1_parser.lextab'))
 
 precedence = (
     ('left', 'BOOLOR'),
@@ -236,7 +236,15 @@ def create_parser():
         # Note: SyntaxError is a built in exception in Python
         # raise SyntaxError(p.type)
 
-    return yacc.yacc(start='program')
-
-lexer = create_lexer()
-parser = create_parser()
+    return yacc.yacc(start='program', tabfile='bx1_parser.parsetab')
+
+def __getattr__(name):
+    """Create the module-level `lexer' and `parser' on first use"""
+    global lexer, parser
+    if name == 'lexer':
+        lexer = create_lexer()
+        return lexer
+    if name == 'parser':
+        parser = create_parser()
+        return parser
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -64,7 +64,9 @@
 import re
 import types
 import sys
+import os
 import inspect
+import pickle
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -77,6 +79,7 @@ yaccdebug   = False            # Debugging mode.  If set, yacc generates a
 
 debug_file  = 'parser.out'     # Default name of the debugging file
 error_count = 3                # Number of symbols that must be shifted to leave recovery mode
+tab_version = 1                # Version of the table cache format written by yacc(tabfile=...)
 resultlimit = 40               # Size limit of results when running in debug mode.
 
 MAXINT = sys.maxsize
@@ -2035,6 +2038,7 @@ class ParserReflect(object):
                 parts.append(' '.join(self.tokens))
             for f in self.pfuncs:
                 if f[3]:
+                    parts.append(f[2])
                     parts.append(f[3])
         except (TypeError, ValueError):
             pass
@@ -2262,6 +2266,82 @@ class ParserReflect(object):
 
         self.grammar = grammar
 
+# -----------------------------------------------------------------------------
+#                          === Table caching ===
+#
+# Building the LALR tables is by far the most expensive part of yacc(). The
+# tables only depend on the grammar, so they can be pickled to a file together
+# with the grammar signature computed by ParserReflect.signature(), and read
+# back by later processes as long as that signature does not change.
+# -----------------------------------------------------------------------------
+
+# This class is a stand-in for Production when the tables come from a cache
+# file.  It only carries the attributes that LRParser needs at parse time.
+
+class MiniProduction(object):
+    def __init__(self, str, name, len, func, file, line):
+        self.name     = name
+        self.len      = len
+        self.func     = func
+        self.callable = None
+        self.file     = file
+        self.line     = line
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
+
+    # Bind the production function name to a callable
+    def bind(self, pdict):
+        if self.func:
+            self.callable = pdict[self.func]
+
+class CachedLRTable(object):
+    def __init__(self, action, goto, productions):
+        self.lr_action      = action
+        self.lr_goto        = goto
+        self.lr_productions = productions
+
+    # Bind all production function names to callable objects in pdict
+    def bind_callables(self, pdict):
+        for p in self.lr_productions:
+            p.bind(pdict)
+
+# Read the tables from `filename'.  Returns None if the file is missing,
+# unreadable, or was written for a different grammar signature.
+def read_table_cache(filename, signature):
+    try:
+        with open(filename, 'rb') as f:
+            tabversion, tabsig, action, goto, productions = pickle.load(f)
+    except Exception:
+        return None
+    if tabversion != tab_version or tabsig != signature:
+        return None
+    productions = [MiniProduction(*p) for p in productions]
+    return CachedLRTable(action, goto, productions)
+
+# Write the tables of `lr' to `filename'.  The file is written under a
+# temporary name and then renamed, so that concurrent processes never see a
+# partially written cache.  Failing to write the cache is not an error.
+def write_table_cache(filename, signature, lr, errorlog):
+    productions = [(p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line)
+                   for p in lr.lr_productions]
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        with open(tmpname, 'wb') as f:
+            pickle.dump((tab_version, signature, lr.lr_action, lr.lr_goto, productions),
+                        f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+    except (IOError, OSError, pickle.PicklingError) as e:
+        errorlog.warning("Couldn't write table cache %r. %s", filename, e)
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+
 # -----------------------------------------------------------------------------
 # yacc(module)
 #
@@ -2270,7 +2350,7 @@ class ParserReflect(object):
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, tabfile=None):
 
     # Reference to the parsing method of the last built parser
     global parse
@@ -2303,6 +2383,19 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if pinfo.error:
         raise YaccError('Unable to build parser')
 
+    # If a table cache was requested, try to reuse the tables it holds.  A
+    # relative `tabfile' is placed next to the module defining the grammar.
+    if tabfile:
+        if not os.path.isabs(tabfile) and '__file__' in pdict:
+            tabfile = os.path.join(os.path.dirname(os.path.abspath(pdict['__file__'])), tabfile)
+        signature = pinfo.signature()
+        lr = read_table_cache(tabfile, signature)
+        if lr is not None:
+            lr.bind_callables(pinfo.pdict)
+            parser = LRParser(lr, pinfo.error_func)
+            parse = parser.parse
+            return parser
+
     if debuglog is None:
         if debug:
             try:
@@ -2474,6 +2567,9 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
                 errorlog.warning('Rule (%s) is never reduced', rejected)
                 warned_never.append(rejected)
 
+    if tabfile:
+        write_table_cache(tabfile, signature, lr, errorlog)
+
     # Build the parser
     lr.bind_callables(pinfo.pdict)
     parser = LRParser(lr, pinfo.error_func)
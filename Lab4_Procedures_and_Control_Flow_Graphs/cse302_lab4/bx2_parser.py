@@ -131,7 +131,7 @@ def create_lexer():
         print_error_message(t, f'Warning: skipping illegal character {t.value[0]}')
         t.lexer.skip(1)
     
-    return extend_lexer(lex.lex())
+    return extend_lexer(lex.lex(cachefile='bx2_parser.lextab'))
 
 # ------------------------------------------------------------------------------
 
@@ -169,7 +169,7 @@ class Node:
             self.value == other.value and \
             self.kids == other.kids
 
-def create_parser():
+def create_parser(rebuild=False):
 
     def p_expr_ident(p):
         '''expr : IDENT'''
@@ -392,23 +392,46 @@ def create_parser():
         # Note: SyntaxError is a built in exception in Python
         raise SyntaxError(p.type)
 
-    return yacc.yacc(start='S')
+    return standalone_yacc('bx2_lr', start='S', tabfile='bx2_parser.parsetab',
+                           rebuild=rebuild)
 
 # ------------------------------------------------------------------------------
 
 
-# Create the lexer and the parser
-parser = create_parser()
-lexer = create_lexer()
+# The lexer and the parser are only created on first use
+def __getattr__(name):
+    """Create the module-level `lexer' and `parser' on first use"""
+    global lexer, parser
+    if name == 'lexer':
+        lexer = create_lexer()
+        return lexer
+    if name == 'parser':
+        parser = create_parser()
+        return parser
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def _get_lexer():
+    return globals().get('lexer') or __getattr__('lexer')
+
+def _get_parser():
+    return globals().get('parser') or __getattr__('parser')
+
+def new_session():
+    """Create a ParseSession with its own lexer and parser state. The
+    module-level `lexer' and `parser' serve only as prototypes, so several
+    sessions can parse different files at the same time."""
+    return ParseSession(_get_lexer(), _get_parser())
 
 def set_source(text):
     """Load some source code directly into the lexer"""
+    lexer = _get_lexer()
     lexer.input(text)
     lexer.lineno = 1
     lexer.provenance = None
 
 def load_source(filename):
     """Load a file into the lexer"""
+    lexer = _get_lexer()
     with open(filename, 'r') as f:
         lexer.input(f.read())
         lexer.lineno = 1
@@ -417,4 +440,7 @@ def load_source(filename):
 # --------------------------------------------------------------------------------
 
 if __name__ == '__main__':
-    pass
+    import sys
+    if sys.argv[1:] == ['--build-parser']:
+        # Generate the standalone parser module bx2_lr.py
+        create_parser(rebuild=True)
@@ -249,13 +249,78 @@ class Munch:
         
 # ------------------------------------------------------------------------------
 
+def compile_bx(bx_file, verbosity=0):
+    """Compile `bx_file' and write the TAC to a .tac file next to it.
+    Returns the name of the TAC file."""
+    import bx2_parser
+    session = bx2_parser.new_session()
+    session.load_source(bx_file)
+    prog = session.parse()
+    print(prog)
+    # every file is type checked in a fresh global scope
+    ast.context = ast.Context()
+    #type check
+    prog.type_check_global()
+    #context._str_(context.first_scope)
+    prog.type_check()
+    if verbosity > 0: print('type check OK \n')
+    
+    munched = Munch(prog)
+    #if interpret:
+    #    execute(...)
+    
+    tac_file = bx_file[:-3] + '.tac'
+    with open(tac_file, 'w') as f:
+        #write the global variables
+        for globvar_name, globvar_value in munched._globvarmap:
+            f.write(f'var {globvar_name} = {globvar_value};\n')
+        
+        #write the procedures
+        for p in munched._procmap.values():
+            proc, proc_instrs = p
+            #not really how params should be read..
+            params = ''
+            for i in range(len(proc.params)):
+                params += str(proc.params[i])
+                if i!=(len(proc.params)-1): params += ', '
+                
+            f.write(f'proc @{proc.name}({proc.params}): \n')
+            for instr in proc_instrs:
+                print(instr, file=f)
+            
+            #f.write(str(munched._procmap[proc][0])+'\n')
+            
+    if verbosity > 0:
+        print(f'{bx_file} -> {tac_file} done')
+    return tac_file
+
+def _init_worker():
+    """Build the parser tables once in each worker process"""
+    import bx2_parser
+    bx2_parser._get_lexer()
+    bx2_parser._get_parser()
+
+def _compile_job(job):
+    """Run compile_bx() in a worker, returning (bx_file, output, error) where
+    `output' is what it printed and `error' is None if it succeeded"""
+    import io, contextlib
+    bx_file, verbosity = job
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            compile_bx(bx_file, verbosity)
+        return bx_file, out.getvalue(), None
+    except (Exception, SystemExit) as exc:
+        return bx_file, out.getvalue(), f'{type(exc).__name__}: {exc}'
+
 # ------------------------------------------------------------------------------
 
 if __name__ == '__main__':
-    import sys, getopt, time, random, bx2_parser
-    opts, bx_files = getopt.getopt(sys.argv[1:], 'hvi', [])
+    import sys, getopt, time, random, multiprocessing
+    opts, bx_files = getopt.getopt(sys.argv[1:], 'hvij:', [])
     verbosity = 0
     interpret = False
+    jobs = 1
     for opt, val in opts:
         if opt == '-h':
             print(f'''\
@@ -265,52 +330,38 @@ Where OPTIONS is one of
 
   -v          Increase verbosity (can be used multiple times)
   -i          Run the TAC interpreter instead of writing TAC files
+  -j N        Compile the files with a pool of N worker processes
   -h          Print this help message''')
             exit(0)
         elif opt == '-v':
             verbosity += 1
         elif opt == '-i':
             interpret = True
+        elif opt == '-j':
+            jobs = int(val)
         else:
             print(f'Unknown option {opt}')
             exit(1)
+    if jobs > 1:
+        for bx_file in bx_files:
+            if not bx_file.endswith('.bx'):
+                print(f'File name {bx_file} does not end in ".bx"')
+                exit(1)
+        # results come back in input order; a failing file does not stop the others
+        failed = 0
+        with multiprocessing.Pool(jobs, initializer=_init_worker) as pool:
+            for bx_file, output, error in pool.imap(_compile_job,
+                                                    [(f, verbosity) for f in bx_files]):
+                print(output, end='')
+                if error is not None:
+                    failed += 1
+                    print(f'{bx_file}: {error}')
+        if failed:
+            print(f'{failed} of {len(bx_files)} files failed')
+            exit(1)
+        exit(0)
     for bx_file in bx_files:
         if not bx_file.endswith('.bx'):
             print(f'File name {bx_file} does not end in ".bx"')
             exit(1)
-        bx2_parser.load_source(bx_file)
-        prog = bx2_parser.parser.parse(lexer=bx2_parser.lexer)
-        print(prog)
-        #type check
-        prog.type_check_global()
-        #context._str_(context.first_scope)
-        prog.type_check()
-        if verbosity > 0: print('type check OK \n')
-        
-        munched = Munch(prog)
-        #if interpret:
-        #    execute(...)
-        
-        tac_file = bx_file[:-3] + '.tac'
-        with open(tac_file, 'w') as f:
-            #write the global variables
-            for globvar_name, globvar_value in munched._globvarmap:
-                f.write(f'var {globvar_name} = {globvar_value};\n')
-            
-            #write the procedures
-            for p in munched._procmap.values():
-                proc, proc_instrs = p
-                #not really how params should be read..
-                params = ''
-                for i in range(len(proc.params)):
-                    params += str(proc.params[i])
-                    if i!=(len(proc.params)-1): params += ', '
-                    
-                f.write(f'proc @{proc.name}({proc.params}): \n')
-                for instr in proc_instrs:
-                    print(instr, file=f)
-                
-                #f.write(str(munched._procmap[proc][0])+'\n')
-                
-        if verbosity > 0:
-            print(f'{bx_file} -> {tac_file} done')
+        compile_bx(bx_file, verbosity)
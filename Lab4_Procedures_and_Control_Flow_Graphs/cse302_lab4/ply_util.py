@@ -5,6 +5,54 @@ Some utilities for using PLY
 """
 
 from ply import lex, yacc
+from array import array
+from bisect import bisect_right
+import copy
+import re
+
+class LineIndex:
+    """Start offsets of the lines of a source `data', which can be a str or
+    a bytes-like buffer such as an mmap. Position queries are answered by
+    binary search in the offset table, which is built on the first query."""
+
+    _newline = re.compile('\n')
+    _bnewline = re.compile(b'\n')
+
+    def __init__(self, data):
+        self.data = data
+        self._starts = None
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            nl = self._newline if isinstance(self.data, str) else self._bnewline
+            starts = array('q', [0])
+            starts.extend(m.end() for m in nl.finditer(self.data))
+            self._starts = starts
+        return self._starts
+
+    def lineno(self, pos):
+        """The 1-based number of the line containing `pos'"""
+        return bisect_right(self.starts, pos)
+
+    def line(self, pos):
+        """Return (bolpos, line) for the line containing `pos'"""
+        starts = self.starts
+        k = bisect_right(starts, pos)
+        bolpos = starts[k - 1]
+        eolpos = starts[k] - 1 if k < len(starts) else len(self.data)
+        line = self.data[bolpos:eolpos]
+        if not isinstance(line, str): line = str(line, 'utf-8', 'replace')
+        return bolpos, line
+
+def line_index(lexer):
+    """Return the LineIndex of the source loaded in `lexer'. It is kept on
+    the lexer and built again only when the lexer gets a new source, so
+    lexers of separate sessions never share an index."""
+    index = getattr(lexer, 'line_index', None)
+    if index is None or index.data is not lexer.lexdata:
+        index = lexer.line_index = LineIndex(lexer.lexdata)
+    return index
 
 def print_at(tok, msg):
     """Print an error message `msg' at the location of `tok'"""
@@ -15,11 +63,7 @@ def print_at(tok, msg):
     else:
         tokstr = str(tok.value)[0]
         curpos = tok.lexer.lexpos
-    # scan backwards from curpos for the position of the beginning of line (bol)
-    bolpos = tok.lexer.lexdata.rfind('\n', 0, curpos) + 1
-    # scan forwards from curpos for the position of the end of the line (eol)
-    eolpos = tok.lexer.lexdata.find('\n', curpos)
-    if eolpos == -1: eolpos = tok.lexer.lexlen
+    bolpos, line = line_index(tok.lexer).line(curpos)
     # offset of the given token
     charpos = max(curpos - bolpos, 0) + 1
     errfile = getattr(tok.lexer, 'errfile', None)
@@ -29,7 +73,7 @@ def print_at(tok, msg):
     else:
         print(f'At line {lineno}, character {charpos}:', file=errfile)
     print(msg, file=errfile)
-    print('>', tok.lexer.lexdata[bolpos:eolpos], file=errfile)
+    print('>', line, file=errfile)
     print(' '*(charpos+1), '^'*len(tokstr), sep='', file=errfile)
 
 def extend_lexer(lexer):
@@ -55,24 +99,49 @@ def extend_lexer(lexer):
     lexer.__iter__ = types.MethodType(__iter__, lexer)
     return lexer
 
+class ParseSession:
+    """A lexer and parser state of its own, for parsing one source at a
+    time. The lexer is a clone of `lexer' and the parser shares the tables
+    of `parser', so sessions are cheap to create, and separate sessions can
+    parse different sources at the same time, e.g. from several threads."""
+
+    def __init__(self, lexer, parser):
+        self.lexer = lexer.clone()
+        if isinstance(self.lexer, lex.Lexer):
+            # the extended methods are bound to the original lexer
+            extend_lexer(self.lexer)
+        # PLY's LRParser keeps its parse state on the instance; the
+        # standalone Parser keeps it in local variables of parse()
+        self.parser = copy.copy(parser) if isinstance(parser, yacc.LRParser) else parser
+
+    def set_source(self, text):
+        """Load some source code directly into the session's lexer"""
+        self.lexer.set_source(text)
+
+    def load_source(self, filename):
+        """Load a file into the session's lexer"""
+        self.lexer.load_source(filename)
+
+    def parse(self):
+        """Parse the loaded source"""
+        return self.parser.parse(lexer=self.lexer)
+
 # ------------------------------------------------------------------------------
 # Location information
 
 class Location:
-    __slots__ = ('data', 'line', 'char', 'provenance', '_cpos', '_extract')
-    def __init__(self, data, line, pos, provenance):
-        self.data = data
+    __slots__ = ('index', 'line', 'char', 'provenance', '_cpos', '_extract')
+    def __init__(self, index, line, pos, provenance):
+        self.index = index
         self.line = line
         self.char = pos
         self.provenance = provenance
 
     def _summarize(self):
-        if not hasattr(self, '_cpos'):
-            bolpos = self.data.rfind('\n', 0, self.char) + 1
-            eolpos = self.data.find('\n', self.char)
-            self._cpos = max(self.char - bolpos, 0) + 1
         if not hasattr(self, '_extract'):
-            self._extract = '> ' + self.data[bolpos:eolpos] + '\n' + ' '*(self._cpos + 1) + '^'
+            bolpos, line = self.index.line(self.char)
+            self._cpos = max(self.char - bolpos, 0) + 1
+            self._extract = '> ' + line + '\n' + ' '*(self._cpos + 1) + '^'
 
     def __str__(self):
         self._summarize()
@@ -83,9 +152,8 @@ class Locatable:
     __slots__ = ('_loc',)
 
     def set_location(self, p, line, pos):
-        data = p.lexer.lexdata
         provenance = getattr(p.lexer, 'provenance', None)
-        self._loc = Location(data, line, pos, provenance)
+        self._loc = Location(line_index(p.lexer), line, pos, provenance)
         return self
 
     def use_location(self, other):
@@ -97,3 +165,182 @@ class Locatable:
         if hasattr(self, '_loc'): return str(self._loc)
         return ''
 
+
+# ------------------------------------------------------------------------------
+# Standalone parsers
+
+_standalone_driver = '''
+class Parser:
+    """LR parser driven by the tables above. Grammar actions are looked up
+    by name in `pdict', and are called with a list `p' where p[1:] are the
+    values of the right hand side and p[0] receives the result."""
+
+    def __init__(self, pdict):
+        self.actions = tuple(pdict[f] if f else None for f in prod_func)
+        self.errorfunc = pdict.get('p_error')
+
+    def parse(self, input=None, lexer=None):
+        """Parse the tokens of `lexer' and return the value of the start
+        symbol. There is no error recovery: on a syntax error the error
+        function is called with the offending token (None at end of input)
+        and, if it returns, the parse is abandoned and None is returned."""
+        if input is not None: lexer.input(input)
+        get_token = lexer.token
+        actions, action, goto, default = self.actions, _action, _goto, _default
+        lens, lhss, tindex = prod_len, prod_lhs, _tindex
+        statestack = [0]
+        valstack = [None]
+        state = 0
+        tok = None
+        ltype = -1
+        while True:
+            t = default[state]
+            if not t:
+                if ltype == -1:
+                    tok = get_token()
+                    ltype = tindex.get(tok.type) if tok else 0
+                t = action[state].get(ltype)
+                if t is None:
+                    if self.errorfunc:
+                        if tok and not hasattr(tok, 'lexer'): tok.lexer = lexer
+                        self.errorfunc(tok)
+                    return None
+            if t > 0:
+                statestack.append(t)
+                valstack.append(tok.value)
+                state = t
+                ltype = -1
+            elif t < 0:
+                plen = lens[-t]
+                if plen:
+                    p = valstack[-plen-1:]
+                    p[0] = None
+                    del valstack[-plen:]
+                    del statestack[-plen:]
+                else:
+                    p = [None]
+                actions[-t](p)
+                valstack.append(p[0])
+                state = goto[statestack[-1]][lhss[-t]]
+                statestack.append(state)
+            else:
+                return valstack[-1]
+
+    def parse_tokens(self, tokens, lexer=None):
+        """Like parse(), but consume plain (type, value, lineno, lexpos)
+        tuples from the iterator `tokens'. The error function receives an
+        ErrorToken whose `lexer' attribute is `lexer'."""
+        next_token = tokens.__next__
+        actions, action, goto, default = self.actions, _action, _goto, _default
+        lens, lhss, tindex = prod_len, prod_lhs, _tindex
+        statestack = [0]
+        valstack = [None]
+        state = 0
+        tok = None
+        ltype = -1
+        while True:
+            t = default[state]
+            if not t:
+                if ltype == -1:
+                    try:
+                        tok = next_token()
+                        ltype = tindex.get(tok[0])
+                    except StopIteration:
+                        tok = None
+                        ltype = 0
+                t = action[state].get(ltype)
+                if t is None:
+                    if self.errorfunc:
+                        self.errorfunc(tok and ErrorToken(tok, lexer))
+                    return None
+            if t > 0:
+                statestack.append(t)
+                valstack.append(tok[1])
+                state = t
+                ltype = -1
+            elif t < 0:
+                plen = lens[-t]
+                if plen:
+                    p = valstack[-plen-1:]
+                    p[0] = None
+                    del valstack[-plen:]
+                    del statestack[-plen:]
+                else:
+                    p = [None]
+                actions[-t](p)
+                valstack.append(p[0])
+                state = goto[statestack[-1]][lhss[-t]]
+                statestack.append(state)
+            else:
+                return valstack[-1]
+
+class ErrorToken:
+    """Token passed to the error function by Parser.parse_tokens()"""
+    def __init__(self, tok, lexer):
+        self.type, self.value, self.lineno, self.lexpos = tok[:4]
+        self.lexer = lexer
+'''
+
+def write_parser_module(parser, filename, signature):
+    """Write the tables of the PLY `parser' to the Python module `filename',
+    together with a table-specialized LR driver that does not depend on PLY"""
+    terminals = ['$end']
+    for actions in parser.action.values():
+        for sym in actions:
+            if sym not in terminals: terminals.append(sym)
+    nonterminals = []
+    for prod in parser.productions:
+        if prod.name not in nonterminals: nonterminals.append(prod.name)
+    tindex = {sym: i for i, sym in enumerate(terminals)}
+    nindex = {sym: i for i, sym in enumerate(nonterminals)}
+    nstates = max(parser.action) + 1
+    with open(filename, 'w') as f:
+        print('# Generated by ply_util.write_parser_module() -- do not edit', file=f)
+        print(f'signature = {signature!r}', file=f)
+        print(f'terminals = {tuple(terminals)!r}', file=f)
+        print(f'nonterminals = {tuple(nonterminals)!r}', file=f)
+        print(f'prod_func = {tuple(p.func for p in parser.productions)!r}', file=f)
+        print(f'prod_len = {tuple(p.len for p in parser.productions)!r}', file=f)
+        print(f'prod_lhs = {tuple(nindex[p.name] for p in parser.productions)!r}', file=f)
+        print('_tindex = {sym: i for i, sym in enumerate(terminals)}', file=f)
+        print('_action = (', file=f)
+        for st in range(nstates):
+            acts = parser.action.get(st, {})
+            print(f'  {{{", ".join(f"{tindex[s]}: {a}" for s, a in acts.items())}}},', file=f)
+        print(')', file=f)
+        print('_goto = (', file=f)
+        for st in range(nstates):
+            gotos = parser.goto.get(st, {})
+            print(f'  {{{", ".join(f"{nindex[s]}: {g}" for s, g in gotos.items())}}},', file=f)
+        print(')', file=f)
+        print(f'_default = {tuple(parser.defaulted_states.get(st, 0) for st in range(nstates))!r}', file=f)
+        f.write(_standalone_driver)
+
+def standalone_yacc(modname, start, tabfile=None, rebuild=False):
+    """Return a parser for the grammar defined in the calling function.
+
+    If the standalone module `modname', placed next to the module of the
+    caller, was generated from the same grammar, its parser is returned and
+    no PLY tables are needed at all. Otherwise a PLY parser is built with
+    yacc.yacc(). With `rebuild' the standalone module is (re)generated."""
+    import importlib, os, sys, types
+    pdict = yacc.get_caller_module_dict(2)
+    pdict['start'] = start
+    pinfo = yacc.ParserReflect(pdict)
+    pinfo.get_all()
+    signature = pinfo.signature()
+    if rebuild:
+        parser = yacc.yacc(module=types.SimpleNamespace(**pdict), start=start,
+                           tabfile=tabfile)
+        modfile = os.path.join(os.path.dirname(os.path.abspath(pdict['__file__'])),
+                               f'{modname}.py')
+        write_parser_module(parser, modfile, signature)
+        sys.modules.pop(modname, None)
+        importlib.invalidate_caches()
+    try:
+        mod = importlib.import_module(modname)
+    except ImportError:
+        mod = None
+    if mod is not None and getattr(mod, 'signature', None) == signature:
+        return mod.Parser(pdict)
+    return yacc.yacc(module=types.SimpleNamespace(**pdict), start=start, tabfile=tabfile)
@@ -367,6 +367,7 @@ def recompute_liveness(cfg, livein, liveout):
 # ------------------------------------------------------------------------------
 
 def main_cfg(tacf):
+    """Generate the CFG of every proc in `tacf', one proc at a time"""
     import logging
     import os
     from argparse import ArgumentParser
@@ -376,9 +377,7 @@ def main_cfg(tacf):
     ap.add_argument('-v', dest='verbosity', default=0, action='count',
                     help='increase verbosity')
     args = ap.parse_args()
-    gvars, procs = dict(), dict()
-    cfgs = []
-    for tlv in tac.load_tac(tacf):
+    for tlv in tac.stream_tac(tacf):
         if isinstance(tlv, tac.Proc):
             logging.info(f'Processing {tlv.name}')
             cfg = infer(tlv)
@@ -388,5 +387,4 @@ def main_cfg(tacf):
             # os.system(f'dot -Tpdf -O {args.file[0]}.{tlv.name[1:]}.dot')
             linearize(tlv, cfg)
             logging.info(f'Finished processing {tlv.name}\n{tlv}')
-            cfgs.append(cfg)
-    return cfgs
+            yield cfg
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+Regression check of the ways tac.py can load and run a program
+
+Every FILE (by default regression/*.tac) is run from @main by each of the
+engines below, and the lines printed must be the same as with
+tac.execute(), and as FILE.expected if there is one. With --fresh, the
+lexer and parser of tac.py are also built from a copy of the sources that
+has none of the cached tables or generated parser modules. Last, the
+prepared code of a program must be released together with the program.
+"""
+
+import tac, tac2c, tactrace
+import gc, glob, io, os, shutil, subprocess, sys, tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def load(tac_file, loader=tac.load_tac, **kwargs):
+    """A fresh (gvars, procs) of `tac_file', since running a program
+    updates its globals in place"""
+    gvars, procs = dict(), dict()
+    for tlv in loader(tac_file, **kwargs):
+        if isinstance(tlv, tac.Proc): procs[tlv.name] = tlv
+        else: gvars[tlv.name] = tlv
+    return gvars, procs
+
+def _run_traced(tac_file, output, tmpdir):
+    trace_file = os.path.join(tmpdir, 'trace.bin')
+    with tac.TraceRecorder(trace_file) as trace:
+        tac.execute_traced(load(tac_file), '@main', (), trace=trace, output=output)
+    # the viewer must be able to read back the whole trace
+    tactrace.render(trace_file, file=io.StringIO())
+
+def _run_profiled(tac_file, output, tmpdir):
+    profile = tac.Profile()
+    tac.execute_profiled(load(tac_file), '@main', (), profile=profile, output=output)
+    # every instruction of a block, apart from the labels that end it, runs
+    # as many times as the block
+    for name, proc in profile.procs.items():
+        counts = profile.instr_counts[name]
+        blocks = profile.blocks(name)
+        ends = [i for i, _, _ in blocks[1:]] + [len(proc.body)]
+        for (i, _, n), end in zip(blocks, ends):
+            if any(counts[j] != n for j in range(i, end) if proc.body[j].opcode != 'label'):
+                raise RuntimeError(f'block {name}:{i} of the profile is not a basic block')
+
+def _run_tacb(tac_file, output, tmpdir):
+    tacb_file = os.path.join(tmpdir, 'prog.tacb')
+    tac.dump_tacb(tac.load_tac(tac_file), tacb_file)
+    tac.execute_prepared(load(tacb_file, tac.load_tacb), '@main', (), output=output)
+
+def _run_batch(tac_file, output, tmpdir):
+    tac.execute_batch(load(tac_file), '@main', [()], output=output)
+
+def _run_c(tac_file, output, tmpdir):
+    c_file = os.path.join(tmpdir, 'prog.tac')
+    shutil.copyfile(tac_file, c_file)
+    exe_file = tac2c.generate(c_file)[-1]
+    result = subprocess.run([exe_file], capture_output=True, text=True)
+    for line in result.stdout.splitlines(): output.line(line)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+
+engines = {
+    'prepared': lambda f, out, tmp: tac.execute_prepared(load(f), '@main', (), output=out),
+    'debug':    lambda f, out, tmp: tac.execute_prepared(load(f), '@main', (), debug=True,
+                                                         output=out),
+    'memo':     lambda f, out, tmp: tac.execute_prepared(load(f), '@main', (),
+                                                         memo=tac.Memo(64), output=out),
+    'profiled': _run_profiled,
+    'traced':   _run_traced,
+    'compiled': lambda f, out, tmp: tac.execute_compiled(load(f), '@main', (), output=out),
+    'fast':     lambda f, out, tmp: tac.execute_prepared(load(f, fast=True), '@main', (),
+                                                         output=out),
+    'mmap':     lambda f, out, tmp: tac.execute_prepared(load(f, mapped=True), '@main', (),
+                                                         output=out),
+    'stream':   lambda f, out, tmp: tac.execute_prepared(load(f, tac.stream_tac), '@main', (),
+                                                         output=out),
+    'tacb':     _run_tacb,
+}
+if tac.np is not None: engines['batch'] = _run_batch
+if shutil.which('gcc'): engines['c'] = _run_c
+
+def run(engine, tac_file, tmpdir):
+    """The lines printed by running `tac_file' with `engine', and the
+    exception that stopped it, if any"""
+    output = tac.Output(capture=True)
+    try:
+        engine(tac_file, output, tmpdir)
+        error = None
+    except Exception as exn:
+        error = exn
+    return output.getvalue().splitlines(), error
+
+def check_file(tac_file, file=None):
+    """Check `tac_file' with every engine and return the number of failures"""
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        expected, error = run(lambda f, out, tmp: tac.execute(load(f), '@main', (), output=out),
+                              tac_file, tmpdir)
+        if error is not None:
+            print(f'FAIL {tac_file} interp: {type(error).__name__}: {error}', file=file)
+            return 1
+        exp_file = os.path.splitext(tac_file)[0] + '.expected'
+        if os.path.exists(exp_file):
+            with open(exp_file) as f:
+                if f.read().splitlines() != expected:
+                    print(f'FAIL {tac_file} interp: differs from {exp_file}', file=file)
+                    failures += 1
+        for name, engine in engines.items():
+            lines, error = run(engine, tac_file, tmpdir)
+            if error is not None:
+                print(f'FAIL {tac_file} {name}: {type(error).__name__}: {error}', file=file)
+                failures += 1
+            elif lines != expected:
+                print(f'FAIL {tac_file} {name}: output differs from interp', file=file)
+                failures += 1
+    if not failures:
+        print(f'ok {tac_file} ({len(engines) + 1} engines)', file=file)
+    return failures
+
+def check_fresh(tac_file, file=None):
+    """Run tac.py on `tac_file' from a copy of the sources with no cached
+    lexer or parser tables: with PLY, with the FastLexer, when generating
+    the standalone parser, and then with the tables just cached. Returns
+    the number of failures."""
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ('tac.py', 'ply_util.py'):
+            shutil.copy(os.path.join(here, name), tmpdir)
+        shutil.copytree(os.path.join(here, 'ply'), os.path.join(tmpdir, 'ply'),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+        src = os.path.abspath(tac_file)
+        expected = subprocess.run([sys.executable, os.path.join(here, 'tac.py'), src],
+                                  capture_output=True, text=True).stdout
+        runs = [('ply', []), ('fast', ['--fast-lexer']),
+                ('standalone', ['--build-parser']), ('cached', [])]
+        for name, flags in runs:
+            cmd = [sys.executable, 'tac.py', *flags, src]
+            result = subprocess.run(cmd, cwd=tmpdir, capture_output=True, text=True)
+            if result.returncode != 0 or result.stdout != expected:
+                err = result.stderr.strip().splitlines()
+                print(f'FAIL fresh build ({name}): {err[-1] if err else "output differs"}',
+                      file=file)
+                failures += 1
+    if not failures:
+        print('ok fresh build of the lexer and parser', file=file)
+    return failures
+
+def check_cache(tac_file, file=None):
+    """Run `tac_file' with prepared code a few times, dropping the program
+    each time, and check that nothing is left in the cache of prepared
+    procs. Returns the number of failures."""
+    for _ in range(3):
+        prog = load(tac_file)
+        run(lambda f, out, tmp: tac.execute_prepared(prog, '@main', (), output=out),
+            tac_file, None)
+        del prog
+    gc.collect()
+    if len(tac._prepared_cache):
+        print(f'FAIL {tac_file}: {len(tac._prepared_cache)} prepared procs outlive '
+              f'their program', file=file)
+        return 1
+    print('ok prepared code is released with its program', file=file)
+    return 0
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    ap = ArgumentParser(description='Check every TAC engine against tac.execute()')
+    ap.add_argument('files', metavar='FILE', type=str, nargs='*',
+                    help='A TAC file (default: regression/*.tac)')
+    ap.add_argument('--fresh', dest='fresh', action='store_true', default=False,
+                    help='Also build the lexer and parser from a tree with no caches')
+    args = ap.parse_args()
+    files = args.files or sorted(glob.glob(os.path.join(here, 'regression', '*.tac')))
+    failures = sum(check_file(tac_file) for tac_file in files)
+    if files:
+        failures += check_cache(files[0])
+    if args.fresh and files:
+        failures += check_fresh(files[0])
+    sys.exit(1 if failures else 0)
@@ -39,6 +39,8 @@ import types
 import copy
 import os
 import inspect
+import pickle
+import hashlib
 
 # This tuple contains acceptable string types
 StringTypes = (str, bytes)
@@ -46,6 +48,9 @@ StringTypes = (str, bytes)
 # This regular expression is used to match valid token names
 _is_identifier = re.compile(r'^[a-zA-Z0-9_]+$')
 
+# Version of the spec cache format written by lex(cachefile=...)
+_cache_version = 1
+
 # Exception thrown when invalid token encountered and no default error
 # handler is defined.
 class LexError(Exception):
@@ -355,20 +360,11 @@ def _form_master_re(relist, reflags, ldict, toknames):
         lexre = re.compile(regex, reflags)
 
         # Build the index to function map for the matching engine
-        lexindexfunc = [None] * (max(lexre.groupindex.values()) + 1)
-        lexindexnames = lexindexfunc[:]
-
+        lexindexnames = [None] * (max(lexre.groupindex.values()) + 1)
         for f, i in lexre.groupindex.items():
-            handle = ldict.get(f, None)
-            if type(handle) in (types.FunctionType, types.MethodType):
-                lexindexfunc[i] = (handle, toknames[f])
+            if ldict.get(f, None) is not None:
                 lexindexnames[i] = f
-            elif handle is not None:
-                lexindexnames[i] = f
-                if f.find('ignore_') > 0:
-                    lexindexfunc[i] = (None, None)
-                else:
-                    lexindexfunc[i] = (None, toknames[f])
+        lexindexfunc = _form_index_funcs(lexindexnames, ldict, toknames)
 
         return [(lexre, lexindexfunc)], [regex], [lexindexnames]
     except Exception:
@@ -377,6 +373,63 @@ def _form_master_re(relist, reflags, ldict, toknames):
         rlist, rre, rnames = _form_master_re(relist[m:], reflags, ldict, toknames)
         return (llist+rlist), (lre+rre), (lnames+rnames)
 
+# -----------------------------------------------------------------------------
+# _form_index_funcs()
+#
+# Given the list mapping regex group numbers to rule names, build the list
+# mapping group numbers to (function, token type) pairs used by Lexer.token().
+# -----------------------------------------------------------------------------
+def _form_index_funcs(lexindexnames, ldict, toknames):
+    lexindexfunc = [None] * len(lexindexnames)
+    for i, f in enumerate(lexindexnames):
+        if f is None:
+            continue
+        handle = ldict.get(f, None)
+        if type(handle) in (types.FunctionType, types.MethodType):
+            lexindexfunc[i] = (handle, toknames[f])
+        elif f.find('ignore_') > 0:
+            lexindexfunc[i] = (None, None)
+        else:
+            lexindexfunc[i] = (None, toknames[f])
+    return lexindexfunc
+
+# -----------------------------------------------------------------------------
+# Lexer spec cache
+#
+# The master regular expressions only depend on the rules collected by
+# LexerReflect, so they can be written to a file keyed by a hash of those
+# rules.  When the hash matches, lex() skips rule validation and reuses the
+# master regex sources (including the way they had to be split) verbatim.
+# -----------------------------------------------------------------------------
+def _spec_digest(linfo, regexs, reflags):
+    spec = (sorted(linfo.tokens), linfo.literals, sorted(linfo.stateinfo.items()),
+            reflags, sorted(regexs.items()), sorted(linfo.ignore.items()),
+            sorted(linfo.toknames.items()))
+    return hashlib.sha256(repr(spec).encode('utf-8')).hexdigest()
+
+def _read_spec_cache(filename, digest):
+    try:
+        with open(filename, 'rb') as f:
+            version, fdigest, spec = pickle.load(f)
+    except Exception:
+        return None
+    if version != _cache_version or fdigest != digest:
+        return None
+    return spec
+
+def _write_spec_cache(filename, digest, spec, errorlog):
+    tmpname = f'{filename}.{os.getpid()}.tmp'
+    try:
+        with open(tmpname, 'wb') as f:
+            pickle.dump((_cache_version, digest, spec), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+    except (IOError, OSError, pickle.PicklingError) as e:
+        errorlog.warning("Couldn't write lexer cache %r. %s", filename, e)
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+
 # -----------------------------------------------------------------------------
 # def _statetoken(s,names)
 #
@@ -715,7 +768,7 @@ class LexerReflect(object):
 # Build all of the regular expression rules from definitions in the supplied module
 # -----------------------------------------------------------------------------
 def lex(*, module=None, object=None, debug=False, 
-        reflags=int(re.VERBOSE), debuglog=None, errorlog=None):
+        reflags=int(re.VERBOSE), debuglog=None, errorlog=None, cachefile=None):
 
     global lexer
 
@@ -748,7 +801,31 @@ def lex(*, module=None, object=None, debug=False,
     # Collect parser information from the dictionary
     linfo = LexerReflect(ldict, log=errorlog, reflags=reflags)
     linfo.get_all()
-    if linfo.validate_all():
+
+    regexs = {}
+    for state in linfo.stateinfo:
+        regex_list = []
+
+        # Add rules defined by functions first
+        for fname, f in linfo.funcsym[state]:
+            regex_list.append('(?P<%s>%s)' % (fname, _get_regex(f)))
+
+        # Now add all of the simple rules
+        for name, r in linfo.strsym[state]:
+            regex_list.append('(?P<%s>%s)' % (name, r))
+
+        regexs[state] = regex_list
+
+    # If a cache file was requested and it matches the rules, skip validation.
+    # A relative `cachefile' is placed next to the module defining the rules.
+    cached = None
+    if cachefile and not linfo.error:
+        if not os.path.isabs(cachefile) and '__file__' in ldict:
+            cachefile = os.path.join(os.path.dirname(os.path.abspath(ldict['__file__'])), cachefile)
+        digest = _spec_digest(linfo, regexs, reflags)
+        cached = _read_spec_cache(cachefile, digest)
+
+    if cached is None and linfo.validate_all():
         raise SyntaxError("Can't build lexer")
 
     # Dump some basic debugging information
@@ -773,32 +850,25 @@ def lex(*, module=None, object=None, debug=False,
     # Get the stateinfo dictionary
     stateinfo = linfo.stateinfo
 
-    regexs = {}
-    # Build the master regular expressions
-    for state in stateinfo:
-        regex_list = []
-
-        # Add rules defined by functions first
-        for fname, f in linfo.funcsym[state]:
-            regex_list.append('(?P<%s>%s)' % (fname, _get_regex(f)))
-            if debug:
+    if debug:
+        for state in stateinfo:
+            for fname, f in linfo.funcsym[state]:
                 debuglog.info("lex: Adding rule %s -> '%s' (state '%s')", fname, _get_regex(f), state)
-
-        # Now add all of the simple rules
-        for name, r in linfo.strsym[state]:
-            regex_list.append('(?P<%s>%s)' % (name, r))
-            if debug:
+            for name, r in linfo.strsym[state]:
                 debuglog.info("lex: Adding rule %s -> '%s' (state '%s')", name, r, state)
 
-        regexs[state] = regex_list
-
     # Build the master regular expressions
 
     if debug:
         debuglog.info('lex: ==== MASTER REGEXS FOLLOW ====')
 
     for state in regexs:
-        lexre, re_text, re_names = _form_master_re(regexs[state], reflags, ldict, linfo.toknames)
+        if cached is not None:
+            re_text, re_names = cached[state]
+            lexre = [(re.compile(text, reflags), _form_index_funcs(names, ldict, linfo.toknames))
+                     for text, names in zip(re_text, re_names)]
+        else:
+            lexre, re_text, re_names = _form_master_re(regexs[state], reflags, ldict, linfo.toknames)
         lexobj.lexstatere[state] = lexre
         lexobj.lexstateretext[state] = re_text
         lexobj.lexstaterenames[state] = re_names
@@ -806,6 +876,11 @@ def lex(*, module=None, object=None, debug=False,
             for i, text in enumerate(re_text):
                 debuglog.info("lex: state '%s' : regex[%d] = '%s'", state, i, text)
 
+    if cachefile and cached is None:
+        spec = {state: (lexobj.lexstateretext[state], lexobj.lexstaterenames[state])
+                for state in regexs}
+        _write_spec_cache(cachefile, digest, spec, errorlog)
+
     # For inclusive states, we need to add the regular expressions from the INITIAL state
     for state, stype in stateinfo.items():
         if state != 'INITIAL' and stype == 'inclusive':
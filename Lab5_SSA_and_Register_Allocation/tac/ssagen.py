@@ -134,18 +134,26 @@ if __name__ == '__main__':
     gvars, procs = dict(), dict()
     for filename in sys.argv[1:]:
         cfgs = cfg_.main_cfg(filename) #compute cfg from tac
-        with open(f'{filename[:-4]}.ssa.tac','w') as f: 
-            for cfg in cfgs:
-                dproc = tac.Proc(cfg.proc_name, [], [])
-                crude_ssa(cfg)
-                minimization_steps(cfg)
-                cfg_.linearize(dproc, cfg)
-                init_args = init_livein(cfg) #find lab_entry 
-                f.write('proc '+str(cfg.proc_name) + '(')
-                if len(init_args)>0:
-                    for arg in init_args[:-1]:
-                        f.write('%'+arg+',')
-                    f.write('%'+init_args[-1]+'):\n')
-                else: f.write('):\n')
-                for instr in dproc.body:
-                    f.write(str(instr)+'\n')
\ No newline at end of file
+        out_file = f'{filename[:-4]}.ssa.tac'
+        # cfgs are generated while the file is parsed, so write to a
+        # temporary file and only replace the output once all went well
+        tmp_file = out_file + '.tmp'
+        try:
+            with open(tmp_file,'w') as f: 
+                for cfg in cfgs:
+                    dproc = tac.Proc(cfg.proc_name, [], [])
+                    crude_ssa(cfg)
+                    minimization_steps(cfg)
+                    cfg_.linearize(dproc, cfg)
+                    init_args = init_livein(cfg) #find lab_entry 
+                    f.write('proc '+str(cfg.proc_name) + '(')
+                    if len(init_args)>0:
+                        for arg in init_args[:-1]:
+                            f.write('%'+arg+',')
+                        f.write('%'+init_args[-1]+'):\n')
+                    else: f.write('):\n')
+                    for instr in dproc.body:
+                        f.write(str(instr)+'\n')
+            os.replace(tmp_file, out_file)
+        finally:
+            if os.path.exists(tmp_file): os.remove(tmp_file)
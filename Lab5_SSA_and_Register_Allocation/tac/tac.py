@@ -7,6 +7,22 @@ Three Address Code (TAC) intermediate representation
 from ply import lex, yacc
 from ply_util import *
 from io import StringIO
+from collections import namedtuple, OrderedDict
+from operator import attrgetter, itemgetter
+import operator
+import re
+import os
+import sys
+import mmap
+import threading
+import weakref
+import json
+import time
+from array import array
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # ------------------------------------------------------------------------------
 
@@ -66,8 +82,8 @@ class Instr:
 
     @classmethod
     def _isphiargs(cls, thing):
-        return (isinstance(thing, dict) and \
-                all(cls._isvar(x[1]) for x in thing))
+        return (isinstance(thing, (tuple, list)) and \
+                all(len(x) == 2 and cls._isvar(x[1]) for x in thing))
 
     @classmethod
     def _isvalid(cls, thing, k):
@@ -203,11 +219,145 @@ def __create_lexer():
         print_at(t, f'Warning: skipping illegal character: {t.value[0]}')
         t.lexer.skip(1)
 
-    return extend_lexer(lex.lex())
+    return extend_lexer(lex.lex(cachefile='tac.lextab'))
+
+Token = namedtuple('Token', ('type', 'value', 'lineno', 'lexpos', 'lexer'))
+
+class FastLexer:
+    """Tokenizer for TAC that scans with a single precompiled regex. It
+    accepts the same language as the PLY lexer from __create_lexer(), keeps
+    `lineno' and `lexpos' the same way, and reports errors through
+    print_at(), so diagnostics are identical.
+
+    token() returns Token tuples, so the lexer can be given to any parser.
+    raw_tokens() produces plain (type, value, lineno, lexpos) tuples, which
+    are much cheaper to create, for parsers that can consume them directly."""
+
+    _scanner = re.compile(r'''[ \t\f\v\r]*(?:
+        (?P<NEWLINE>\n|//[^\n]*\n?)
+      | (?P<OPCODE>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<NUM64>0|-?[1-9][0-9]*)
+      | (?P<TEMP>%(?:_|0|[1-9][0-9]*|[A-Za-z][A-Za-z0-9_]*)(?:\.[0-9]+)?)
+      | (?P<LABEL>\.L(?:0|[1-9][0-9]*|[A-Za-z0-9_]+))
+      | (?P<GLABEL>@[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<LPAREN>\()
+      | (?P<RPAREN>\))
+      | (?P<EQ>=)
+      | (?P<COMMA>,)
+      | (?P<SEMICOLON>;)
+      | (?P<COLON>:)
+      | (?P<ILLEGAL>[\s\S])
+      | $)''', re.VERBOSE)
+    _bscanner = re.compile(_scanner.pattern.encode(), re.VERBOSE)
+
+    _kinds = [None] * (_scanner.groups + 1)
+    for _kind, _index in _scanner.groupindex.items(): _kinds[_index] = _kind
+    _keywords = {'var': 'VAR', 'proc': 'PROC', 'phi': 'PHI'}
+
+    def __init__(self):
+        self.lexdata = ''
+        self.lexpos = 0
+        self.lexlen = 0
+        self.lineno = 1
+        self.provenance = None
+        self._tokens = iter(())
+
+    def input(self, text):
+        self.lexdata = text
+        self.lexpos = 0
+        self.lexlen = len(text)
+        self._tokens = self._scan()
+
+    def set_source(self, text):
+        """Load some source code directly into the lexer"""
+        self.input(text)
+        self.lineno = 1
+        self.provenance = None
+
+    def load_source(self, filename, mapped=False):
+        """Load a file into the lexer. If `mapped' is True, the file is
+        memory-mapped and scanned in place instead of being read in."""
+        with open(filename, 'rb' if mapped else 'r') as f:
+            if not mapped:
+                self.input(f.read())
+            elif os.fstat(f.fileno()).st_size == 0:
+                self.input(b'')   # empty files cannot be mapped
+            else:
+                self.input(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.lineno = 1
+            self.provenance = f'file "{filename}"'
+
+    def clone(self):
+        """Return a new FastLexer with the same input and position"""
+        other = FastLexer()
+        other.provenance = self.provenance
+        other.input(self.lexdata)
+        other.lexpos, other.lineno = self.lexpos, self.lineno
+        return other
+
+    def raw_tokens(self):
+        """Iterator over the remaining tokens as plain tuples"""
+        return self._tokens
+
+    def token(self):
+        tok = next(self._tokens, None)
+        return tok and Token(*tok, self)
+
+    def __iter__(self):
+        while True:
+            tok = self.token()
+            if not tok: break
+            yield tok
+
+    def _error_at(self, m, i, msg):
+        # rematch from the start of the token to leave out leading whitespace
+        self.lexmatch = m.re.match(self.lexdata, m.start(i))
+        self.lexpos = m.end()
+        print_at(Token(self._kinds[i], m[i], self.lineno, m.start(i), self), msg)
+        del self.lexmatch
+
+    def _scan(self):
+        data = self.lexdata
+        binary = not isinstance(data, str)
+        scanner = self._bscanner if binary else self._scanner
+        kinds, keywords = self._kinds, self._keywords
+        NEWLINE, OPCODE, NUM64, ILLEGAL = (scanner.groupindex[k] for k in
+                                          ('NEWLINE', 'OPCODE', 'NUM64', 'ILLEGAL'))
+        for m in scanner.finditer(data, self.lexpos):
+            i = m.lastindex
+            if i == NEWLINE:
+                self.lineno += 1
+                continue
+            if i is None: break   # trailing whitespace
+            value = m[i]
+            if binary: value = str(value, 'utf-8', 'replace')
+            kind = kinds[i]
+            if i == OPCODE:
+                if value in keywords: kind = keywords[value]
+                elif value not in opcodes:
+                    self._error_at(m, i, f'Error: unknown opcode {value}')
+                    raise SyntaxError(f'badop')
+            elif i == NUM64:
+                value = int(value)
+                if value & 0xffffffffffffffff != value:
+                    self._error_at(m, i, f'Error: numerical literal {value} not in [{-1<<63}, {1<<63})')
+                    raise SyntaxError('immint')
+            elif i == ILLEGAL:
+                self.lexpos = m.start(i)
+                print_at(Token('error', value, self.lineno, self.lexpos, self),
+                         f'Warning: skipping illegal character: {value}')
+                continue
+            self.lexpos = m.end()
+            yield (kind, value, self.lineno, m.start(i))
+        self.lexpos = self.lexlen + 1
+
+def __create_fast_lexer():
+    """Create and return a FastLexer for a TAC"""
+    return FastLexer()
 
 # ------------------------------------------------------------------------------
 
-def __create_parser():
+def __create_parser(rebuild=False):
     def p_program(p):
         '''program : program gvar
                    | program proc
@@ -310,7 +460,8 @@ def __create_parser():
             print_at(p, f'Error: syntax error at token {p.type}')
         raise RuntimeError('parsing')
 
-    return yacc.yacc(start='program')
+    return standalone_yacc('tac_lr', start='program', tabfile='tac.parsetab',
+                           rebuild=rebuild)
 
 # ------------------------------------------------------------------------------
 
@@ -350,6 +501,49 @@ jumps = {
     'jle': (lambda k: untwoc(k) <= 0),
 }
 
+# The same operations on values kept as signed Python ints in the int64
+# range, as prepared code does. A result is wrapped only if it leaves the
+# range, and the operations that cannot leave it are the operator module
+# functions themselves.
+
+def wrap(x):
+    """Wrap the Python int `x' into the signed 64-bit range"""
+    return ((x + sign_mask) & full_mask) - sign_mask
+
+def _sadd(a, b):
+    r = a + b
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _ssub(a, b):
+    r = a - b
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _smul(a, b):
+    r = a * b
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _sdiv(a, b):
+    r = int(a / b)
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _smod(a, b):
+    r = a - b * int(a / b)
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _sshl(a, b):
+    r = a << b
+    return r if -sign_mask <= r < sign_mask else wrap(r)
+def _sneg(a):
+    return -a if a != -sign_mask else a
+
+signed_binops = {
+    'add': _sadd, 'sub': _ssub, 'mul': _smul, 'div': _sdiv, 'mod': _smod,
+    'and': operator.and_, 'or': operator.or_, 'xor': operator.xor,
+    'shl': _sshl, 'shr': operator.rshift,
+}
+signed_unops = {
+    'neg': _sneg, 'not': operator.invert,
+}
+signed_jumps = {
+    'jz': operator.not_, 'jnz': operator.truth,
+    'jl': (0).__gt__, 'jle': (0).__ge__,
+}
+
 class TempMap(dict):
     """Mapping temporaries to values"""
 
@@ -385,6 +579,48 @@ class TempMap(dict):
             else:
                 super().__setitem__(tmp, val)
 
+class Output:
+    """Buffered destination of the lines printed while running a program.
+
+    With output=Output(...), the execute functions hand every line to
+    line() instead of printing it. The lines are written to `file' (by
+    default sys.stdout) in chunks of `chunk_lines' lines, and the rest
+    when flush() is called or the `with' block ends. With capture=True
+    nothing is written, and getvalue() returns all the text so far."""
+
+    def __init__(self, file=None, chunk_lines=4096, capture=False):
+        self.file = file
+        self.chunk_lines = chunk_lines
+        self.capture = capture
+        self.lines = []
+        self.captured = []
+
+    def line(self, text):
+        lines = self.lines
+        lines.append(text)
+        if len(lines) >= self.chunk_lines: self.flush()
+
+    def flush(self):
+        if not self.lines: return
+        text = '\n'.join(self.lines) + '\n'
+        self.lines = []
+        if self.capture:
+            self.captured.append(text)
+        else:
+            file = self.file or sys.stdout
+            file.write(text)
+            file.flush()
+
+    def getvalue(self):
+        self.flush()
+        return ''.join(self.captured)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
 def execute(tac_prog, proc_name, args, **kwargs):
     gvars, procs = tac_prog
     show_proc = kwargs.get('show_proc', False)
@@ -392,6 +628,8 @@ def execute(tac_prog, proc_name, args, **kwargs):
     only_decimal = kwargs.get('only_decimal', True)
     depth = kwargs.get('depth', 0)
     indent = '  ' * depth
+    output = kwargs.get('output')
+    emit = print if output is None else output.line
 
     values = TempMap(gvars)
     proc = procs[proc_name]
@@ -402,7 +640,7 @@ def execute(tac_prog, proc_name, args, **kwargs):
     oldvalues = values.copy()
 
     proc_desc = f'{proc_name}({",".join(k + "=" + str(v) for k, v in values.items())})'
-    if show_proc: print(f'// {indent}entering {proc_desc}')
+    if show_proc: emit(f'// {indent}entering {proc_desc}')
 
     labels = dict()
     for i, instr in enumerate(proc.body):
@@ -422,7 +660,7 @@ def execute(tac_prog, proc_name, args, **kwargs):
         instr = proc.body[pc]
         pc += 1
 
-        if show_instr: print(f'// {indent}[{pc+1: 4d}] {instr}')
+        if show_instr: emit(f'// {indent}[{pc+1: 4d}] {instr}')
         if instr.opcode == 'nop':
             pass
         elif instr.opcode == 'label':
@@ -452,14 +690,14 @@ def execute(tac_prog, proc_name, args, **kwargs):
                 pc = labels[lab_cur]
         elif instr.opcode == 'const':
             if not isinstance(instr.arg1, int):
-                print(f'Missing or bad argument: {instr.arg1}')
+                emit(f'Missing or bad argument: {instr.arg1}')
                 raise RuntimeError
             values[instr.dest] = twoc(instr.arg1)
         elif instr.opcode == 'copy':
             values[instr.dest] = values[instr.arg1]
         elif instr.opcode == 'param':
             if not isinstance(instr.arg1, int) or instr.arg1 < 1:
-                print(f'Bad argument to param: '
+                emit(f'Bad argument to param: '
                       f'expecting int >= 1, got {instr.arg1}')
             # make params big enough to hold instr.arg1 items
             for _ in range(instr.arg1 - len(params)):
@@ -472,10 +710,10 @@ def execute(tac_prog, proc_name, args, **kwargs):
                                        f'expected 1, got {len(params)}')
                 if instr.arg1 == '@__bx_print_int':
                     u = params[0]
-                    if only_decimal: print(str(untwoc(u)))
-                    else: print(f'{untwoc(u): 20d}  0x{u:016x}  0b{u:064b}')
+                    if only_decimal: emit(str(untwoc(u)))
+                    else: emit(f'{untwoc(u): 20d}  0x{u:016x}  0b{u:064b}')
                 elif instr.arg1 == '@__bx_print_bool':
-                    print('false' if params[0] == 0 else 'true')
+                    emit('false' if params[0] == 0 else 'true')
                 else:
                     raise RuntimeError(f'Unknown print() specialization: {instr.arg1}')
             else:
@@ -488,7 +726,7 @@ def execute(tac_prog, proc_name, args, **kwargs):
         elif instr.opcode == 'ret':
             retval = None if instr.arg1 == dummy_temp else values[instr.arg1]
             if show_proc:
-                print(f'// {indent}{proc_desc} --> {retval}')
+                emit(f'// {indent}{proc_desc} --> {retval}')
             return retval
         elif instr.opcode in binops:
             u = values[instr.arg1]
@@ -497,27 +735,2084 @@ def execute(tac_prog, proc_name, args, **kwargs):
         elif instr.opcode in unops:
             u = values[instr.arg1]
             if instr.arg2 != None:
-                print(f'Unary operator {self.opcode} has two arguments!')
+                emit(f'Unary operator {self.opcode} has two arguments!')
                 raise RuntimeError
             values[instr.dest] = unops[instr.opcode](u)
         else:
-            print(f'Unknown opcode {instr.opcode}')
+            emit(f'Unknown opcode {instr.opcode}')
             raise RuntimeError
-    print(f'// {indent}{proc_desc} --> NONE')
+    emit(f'// {indent}{proc_desc} --> NONE')
+
+# --------------------------------------------------------------------------------
+# Prepared execution
+#
+# prepare() decodes the body of a Proc once into a list of handlers, one per
+# instruction, with the jump targets resolved to indices into that list. A
+# handler is a closure that takes the current Frame, performs its
+# instruction, and returns the index of the next handler to run, or one of
+# the negative codes below. The handler for `ret' returns _RET, and the
+# handler placed after the last instruction, which is reached by falling
+# off the end of the body, returns _FALL_OFF. The handler for a call
+# records the callee in the Frame and returns _CALL, and the machine then
+# pushes a new frame on its own stack, so no Python recursion is involved
+# and the depth of TAC recursion is limited only by memory.
+#
+# A run of phi instructions at the start of a block is a single parallel
+# copy along the incoming edge. For each predecessor label it is
+# precomputed which temporaries move where, so entering a block only moves
+# the values its phis read, and nothing is saved on jumps.
+#
+# The temporaries of a proc are numbered when it is prepared, and a Frame
+# keeps their values in the list `regs' indexed by these slot numbers.
+# Slot 0 always holds 0 and is what %_ reads; slot 1 is where writes to %_
+# go. Globals are resolved to their Gvar when the proc is prepared.
+#
+# Values are signed Python ints, computed with signed_binops and friends.
+# Gvars keep the 64-bit words that execute() uses, and the arguments and
+# result of execute_prepared() are words too, so values are converted
+# only there and when they are printed.
+
+_ZERO_SLOT, _SINK_SLOT = 0, 1
+_RET, _FALL_OFF, _CALL = -1, -2, -3
+
+class Frame:
+    """State of one activation of a prepared proc. When the frame makes a
+    call, `pc' is where to resume, and `callee', `call_args' and `ret_set'
+    describe the call and where its result goes."""
+    __slots__ = ('machine', 'prep', 'args', 'regs', 'lab_prev', 'lab_cur',
+                 'params', 'retval', 'depth',
+                 'pc', 'callee', 'call_args', 'ret_set')
+
+class PreparedProc:
+    """A Proc decoded for execute_prepared(). It records the body list,
+    globals and mode it was prepared from, so that prepare_cached() can
+    tell when it is stale. Frames for it are recycled through `pool'. It
+    only keeps a weak reference to the Proc, which is its key in the cache
+    of prepare_cached()."""
+    __slots__ = ('_proc', 'body', 'gvars', 'debug', 'labels', 'code', 'nslots',
+                 'arg_setters', 'slots', 'init_regs', 'pool')
+    def __init__(self, proc, gvars, debug, labels, code, nslots, arg_setters,
+                 slots=None):
+        self._proc = weakref.ref(proc)
+        self.body = proc.body
+        self.gvars = gvars
+        self.debug = debug
+        self.labels = labels
+        self.code = code
+        self.nslots = nslots
+        self.arg_setters = arg_setters
+        self.slots = slots
+        self.init_regs = [None] * nslots
+        self.init_regs[_ZERO_SLOT] = 0
+        self.pool = []
+
+    @property
+    def proc(self):
+        return self._proc()
+
+def _resolve_labels(proc):
+    """Map every label of `proc' to the index of the first non-label
+    instruction after it"""
+    labels = dict()
+    body = proc.body
+    for i, instr in enumerate(body):
+        if instr.opcode != 'label': continue
+        if instr.arg1 in labels:
+            raise RuntimeError(f'Reused label {instr.arg1}')
+        ni = i + 1 # next instruction index
+        while ni < len(body):
+            if body[ni].opcode != 'label': break
+            ni += 1
+        labels[instr.arg1] = ni
+    return labels
+
+def _check_value(val):
+    if not (isinstance(val, int) and -sign_mask <= val < sign_mask):
+        raise RuntimeError(f'Illegal value: {val}: '
+                           f'{-0x8000000000000000 <= val} '
+                           f'{val < 0x8000000000000000}')
+
+class _Preparer:
+    """Operand resolution for prepare()
+
+    slot() gives the slot of a temporary, or None for a global, and the
+    decoders use it to pick a handler that indexes `regs' directly. For
+    other operands, and for all operands in debug mode, getter() and
+    setter() return closures that do the access, where the debug versions
+    validate every write and detect reads of unset temporaries."""
+
+    def __init__(self, proc, gvars, debug):
+        self.labels = _resolve_labels(proc)
+        self.gvars = gvars
+        self.debug = debug
+        self.slots = {dummy_temp: _ZERO_SLOT}
+
+    def slot(self, tmp, write=False):
+        if tmp[0] == '@' or self.debug: return None
+        if tmp == dummy_temp: return _SINK_SLOT if write else _ZERO_SLOT
+        return self.slots.setdefault(tmp, len(self.slots) + 1)
+
+    def _gvar(self, tmp):
+        gvar = self.gvars.get(tmp)
+        if gvar is None:
+            # an unknown global is only an error if it is used
+            def gvar_missing(f): return f.machine.gvars[tmp]
+            return gvar_missing
+        return lambda f: gvar
+
+    def getter(self, tmp):
+        """Closure reading `tmp'"""
+        if tmp[0] == '@':
+            gvar = self._gvar(tmp)
+            return lambda f: untwoc(gvar(f).value)
+        if tmp == dummy_temp: return lambda f: 0
+        k = self.slots.setdefault(tmp, len(self.slots) + 1)
+        if not self.debug: return lambda f: f.regs[k]
+        def get(f):
+            val = f.regs[k]
+            if val is None: raise KeyError(tmp)
+            return val
+        return get
+
+    def setter(self, tmp):
+        """Closure writing `tmp'"""
+        if tmp[0] == '@':
+            gvar, debug = self._gvar(tmp), self.debug
+            def set_global(f, val):
+                if debug: _check_value(val)
+                gvar(f).value = val & full_mask
+            return set_global
+        if tmp == dummy_temp:
+            def set_sink(f, val): pass
+            return set_sink
+        k = self.slots.setdefault(tmp, len(self.slots) + 1)
+        if not self.debug:
+            def set_(f, val): f.regs[k] = val
+            return set_
+        def set_checked(f, val):
+            _check_value(val)
+            f.regs[k] = val
+        return set_checked
+
+def _bad_jump(lab):
+    def h(f):
+        raise RuntimeError(f'Unknown jump destination {lab}')
+    return h
+
+def _decode_nop(instr, prep, nxt):
+    return lambda f: nxt
+
+def _decode_label(instr, prep, nxt):
+    lab = instr.arg1
+    def h(f):
+        f.lab_prev, f.lab_cur = f.lab_cur, lab
+        return nxt
+    return h
+
+def _decode_phis(phis, prep, nxt):
+    """Decode a run of phi instructions into one handler that does the
+    parallel copy for the edge from `lab_prev'"""
+    sources = []
+    for phi in phis:
+        srcs = dict()
+        for lab, tmp in phi.arg1: srcs.setdefault(lab, tmp)
+        sources.append(srcs)
+    preds = [lab for lab in sources[0] if all(lab in srcs for srcs in sources)]
+    def unresolved(lab_prev):
+        for phi, srcs in zip(phis, sources):
+            if lab_prev not in srcs:
+                raise RuntimeError(f'cannot resolve phi: '
+                                   f'came from {lab_prev}, '
+                                   f'can only handle [{",".join(lab for lab, _ in phi.arg1)}]')
+    dests = tuple(prep.slot(phi.dest, write=True) for phi in phis)
+    moves = {lab: tuple(prep.slot(srcs[lab]) for srcs in sources) for lab in preds}
+    if None not in dests and all(None not in m for m in moves.values()):
+        if len(phis) == 1:
+            d = dests[0]
+            moves = {lab: m[0] for lab, m in moves.items()}
+            def h(f):
+                a = moves.get(f.lab_prev)
+                if a is None: unresolved(f.lab_prev)
+                regs = f.regs
+                regs[d] = regs[a]
+                return nxt
+            return h
+        moves = {lab: itemgetter(*m) for lab, m in moves.items()}
+        def h(f):
+            fetch = moves.get(f.lab_prev)
+            if fetch is None: unresolved(f.lab_prev)
+            regs = f.regs
+            for d, val in zip(dests, fetch(regs)):
+                regs[d] = val
+            return nxt
+        return h
+    setters = tuple(prep.setter(phi.dest) for phi in phis)
+    moves = {lab: tuple(prep.getter(srcs[lab]) for srcs in sources) for lab in preds}
+    def h(f):
+        getters = moves.get(f.lab_prev)
+        if getters is None: unresolved(f.lab_prev)
+        vals = [get(f) for get in getters]
+        for set_, val in zip(setters, vals):
+            set_(f, val)
+        return nxt
+    return h
+
+def _decode_jmp(instr, prep, nxt):
+    lab = instr.arg1
+    if lab not in prep.labels: return _bad_jump(lab)
+    target = prep.labels[lab]
+    def h(f):
+        f.lab_prev, f.lab_cur = f.lab_cur, lab
+        return target
+    return h
+
+def _decode_cjump(instr, prep, nxt):
+    lab = instr.arg2
+    if lab not in prep.labels: return _bad_jump(lab)
+    target = prep.labels[lab]
+    test = signed_jumps[instr.opcode]
+    a = prep.slot(instr.arg1)
+    if a is not None:
+        def h(f):
+            if test(f.regs[a]):
+                f.lab_prev, f.lab_cur = f.lab_cur, lab
+                return target
+            return nxt
+        return h
+    get = prep.getter(instr.arg1)
+    def h(f):
+        if test(get(f)):
+            f.lab_prev, f.lab_cur = f.lab_cur, lab
+            return target
+        return nxt
+    return h
+
+def _decode_const(instr, prep, nxt):
+    val = untwoc(twoc(instr.arg1))
+    d = prep.slot(instr.dest, write=True)
+    if d is not None:
+        def h(f):
+            f.regs[d] = val
+            return nxt
+        return h
+    set_ = prep.setter(instr.dest)
+    def h(f):
+        set_(f, val)
+        return nxt
+    return h
+
+def _decode_copy(instr, prep, nxt):
+    d, a = prep.slot(instr.dest, write=True), prep.slot(instr.arg1)
+    if d is not None and a is not None:
+        def h(f):
+            regs = f.regs
+            regs[d] = regs[a]
+            return nxt
+        return h
+    set_, get = prep.setter(instr.dest), prep.getter(instr.arg1)
+    def h(f):
+        set_(f, get(f))
+        return nxt
+    return h
+
+def _decode_param(instr, prep, nxt):
+    k, get = instr.arg1, prep.getter(instr.arg2)
+    bad = not isinstance(k, int) or k < 1
+    def h(f):
+        if bad:
+            f.machine.emit(f'Bad argument to param: '
+                  f'expecting int >= 1, got {k}')
+        params = f.params
+        # make params big enough to hold k items
+        for _ in range(k - len(params)):
+            params.append(None)
+        params[k - 1] = get(f)
+        return nxt
+    return h
+
+def _decode_call(instr, prep, nxt):
+    callee, nargs = instr.arg1, instr.arg2
+    if callee.startswith('@__bx_print'):
+        def h(f):
+            params = f.params
+            if len(params) != 1:
+                raise RuntimeError(f'Bad number of arguments to print(): '
+                                   f'expected 1, got {len(params)}')
+            if callee == '@__bx_print_int':
+                x = params[0]
+                if f.machine.only_decimal: f.machine.emit(str(x))
+                else:
+                    u = x & full_mask
+                    f.machine.emit(f'{x: 20d}  0x{u:016x}  0b{u:064b}')
+            elif callee == '@__bx_print_bool':
+                f.machine.emit('false' if params[0] == 0 else 'true')
+            else:
+                raise RuntimeError(f'Unknown print() specialization: {callee}')
+            f.params = []
+            return nxt
+        return h
+    set_ = prep.setter(instr.dest)
+    def h(f):
+        params = f.params
+        if len(params) < nargs:
+            raise RuntimeError(f'Bad number of arguments to {callee}(): '
+                               f'expected {nargs}, got {len(params)}')
+        f.params = []
+        f.pc, f.callee, f.call_args, f.ret_set = nxt, callee, params, set_
+        return _CALL
+    return h
+
+def _decode_ret(instr, prep, nxt):
+    if instr.arg1 == dummy_temp:
+        def h(f):
+            f.retval = None
+            return _RET
+        return h
+    get = prep.getter(instr.arg1)
+    def h(f):
+        f.retval = get(f)
+        return _RET
+    return h
+
+def _decode_add(d, a, b, nxt):
+    def h(f):
+        regs = f.regs
+        r = regs[a] + regs[b]
+        regs[d] = r if -sign_mask <= r < sign_mask else wrap(r)
+        return nxt
+    return h
+
+def _decode_sub(d, a, b, nxt):
+    def h(f):
+        regs = f.regs
+        r = regs[a] - regs[b]
+        regs[d] = r if -sign_mask <= r < sign_mask else wrap(r)
+        return nxt
+    return h
+
+def _decode_mul(d, a, b, nxt):
+    def h(f):
+        regs = f.regs
+        r = regs[a] * regs[b]
+        regs[d] = r if -sign_mask <= r < sign_mask else wrap(r)
+        return nxt
+    return h
+
+# binops whose handlers on slots do the arithmetic inline
+_inline_binops = {'add': _decode_add, 'sub': _decode_sub, 'mul': _decode_mul}
+
+def _decode_binop(instr, prep, nxt):
+    op = signed_binops[instr.opcode]
+    d = prep.slot(instr.dest, write=True)
+    a, b = prep.slot(instr.arg1), prep.slot(instr.arg2)
+    if d is not None and a is not None and b is not None:
+        if instr.opcode in _inline_binops:
+            return _inline_binops[instr.opcode](d, a, b, nxt)
+        def h(f):
+            regs = f.regs
+            regs[d] = op(regs[a], regs[b])
+            return nxt
+        return h
+    set_ = prep.setter(instr.dest)
+    get_a, get_b = prep.getter(instr.arg1), prep.getter(instr.arg2)
+    def h(f):
+        set_(f, op(get_a(f), get_b(f)))
+        return nxt
+    return h
+
+def _decode_unop(instr, prep, nxt):
+    op = signed_unops[instr.opcode]
+    d, a = prep.slot(instr.dest, write=True), prep.slot(instr.arg1)
+    if d is not None and a is not None:
+        def h(f):
+            regs = f.regs
+            regs[d] = op(regs[a])
+            return nxt
+        return h
+    set_, get = prep.setter(instr.dest), prep.getter(instr.arg1)
+    def h(f):
+        set_(f, op(get(f)))
+        return nxt
+    return h
+
+def _fall_off(f):
+    f.retval = None
+    return _FALL_OFF
+
+_decoders = {
+    'nop': _decode_nop, 'label': _decode_label,
+    'jmp': _decode_jmp, 'const': _decode_const, 'copy': _decode_copy,
+    'param': _decode_param, 'call': _decode_call, 'ret': _decode_ret,
+    **{op: _decode_cjump for op in jumps},
+    **{op: _decode_binop for op in binops},
+    **{op: _decode_unop for op in unops},
+}
+
+# Superinstructions. After decoding, _fuse() replaces the handlers of some
+# frequent sequences of adjacent instructions with one handler that does
+# the work of the whole sequence, saving a round trip through the dispatch
+# loop per instruction. The handlers of the later instructions stay in
+# place, so a jump into the middle of a sequence still works; only
+# temporaries that live in slots are fused, so %_ reads 0 and its writes
+# go to the sink slot exactly as without fusion.
+
+def _fuse_const_binop(k, val, d, a, opcode, nxt):
+    """%k = const val; %d = opcode %a, %k"""
+    if opcode == 'add':
+        def h(f):
+            regs = f.regs
+            regs[k] = val
+            r = regs[a] + val
+            regs[d] = r if -sign_mask <= r < sign_mask else wrap(r)
+            return nxt
+        return h
+    if opcode == 'sub':
+        def h(f):
+            regs = f.regs
+            regs[k] = val
+            r = regs[a] - val
+            regs[d] = r if -sign_mask <= r < sign_mask else wrap(r)
+            return nxt
+        return h
+    op = signed_binops[opcode]
+    def h(f):
+        regs = f.regs
+        regs[k] = val
+        regs[d] = op(regs[a], val)
+        return nxt
+    return h
+
+def _fuse_sub_cjump(d, a, b, test, lab, target, nxt):
+    """%d = sub %a, %b; jcc %d, lab"""
+    def h(f):
+        regs = f.regs
+        r = regs[a] - regs[b]
+        if not -sign_mask <= r < sign_mask: r = wrap(r)
+        regs[d] = r
+        if test(r):
+            f.lab_prev, f.lab_cur = f.lab_cur, lab
+            return target
+        return nxt
+    return h
+
+def _fuse_const_sub_cjump(k, val, d, a, test, lab, target, nxt):
+    """%k = const val; %d = sub %a, %k; jcc %d, lab"""
+    def h(f):
+        regs = f.regs
+        regs[k] = val
+        r = regs[a] - val
+        if not -sign_mask <= r < sign_mask: r = wrap(r)
+        regs[d] = r
+        if test(r):
+            f.lab_prev, f.lab_cur = f.lab_cur, lab
+            return target
+        return nxt
+    return h
+
+def _fuse_copies(pairs, then):
+    """A run of %d = copy %a, followed by the handler `then'"""
+    if len(pairs) == 1:
+        (d, a), = pairs
+        def h(f):
+            regs = f.regs
+            regs[d] = regs[a]
+            return then(f)
+        return h
+    def h(f):
+        regs = f.regs
+        for d, a in pairs: regs[d] = regs[a]
+        return then(f)
+    return h
+
+def _fuse_params_call(srcs, call, unfused):
+    """param 1, ...; param n, ...; call -- when no params are pending"""
+    if len(srcs) == 1:
+        s, = srcs
+        def h(f):
+            if f.params: return unfused(f)
+            f.params = [f.regs[s]]
+            return call(f)
+        return h
+    def h(f):
+        if f.params: return unfused(f)
+        regs = f.regs
+        f.params = [regs[s] for s in srcs]
+        return call(f)
+    return h
+
+def _fuse(body, code, prep):
+    """Replace handlers in `code' by superinstructions where possible"""
+    def slots(*tmps):
+        return [prep.slot(t) for t in tmps]
+    def jump_target(instr):
+        if instr.opcode not in jumps or instr.arg2 not in prep.labels: return None
+        return prep.labels[instr.arg2]
+    # backwards, so that a run of copies is fused with the already fused
+    # handler that follows it
+    for i in range(len(body) - 2, -1, -1):
+        x, y = body[i], body[i + 1]
+        z = body[i + 2] if i + 2 < len(body) else None
+        if x.opcode == 'const' and y.opcode == 'sub' and z is not None \
+           and y.arg2 == x.dest != y.arg1 and z.arg1 == y.dest \
+           and x.dest != dummy_temp and y.dest != dummy_temp \
+           and jump_target(z) is not None:
+            k, d, a = prep.slot(x.dest, write=True), prep.slot(y.dest, write=True), prep.slot(y.arg1)
+            if None not in (k, d, a):
+                code[i] = _fuse_const_sub_cjump(k, untwoc(twoc(x.arg1)), d, a,
+                                                signed_jumps[z.opcode], z.arg2,
+                                                jump_target(z), i + 3)
+                continue
+        if x.opcode == 'sub' and x.dest == y.arg1 and x.dest != dummy_temp \
+           and jump_target(y) is not None:
+            d, a, b = prep.slot(x.dest, write=True), *slots(x.arg1, x.arg2)
+            if None not in (d, a, b):
+                code[i] = _fuse_sub_cjump(d, a, b, signed_jumps[y.opcode], y.arg2,
+                                          jump_target(y), i + 2)
+                continue
+        if x.opcode == 'const' and y.opcode in binops and x.dest != dummy_temp \
+           and y.arg2 == x.dest != y.arg1:
+            k, d, a = prep.slot(x.dest, write=True), prep.slot(y.dest, write=True), prep.slot(y.arg1)
+            if None not in (k, d, a):
+                code[i] = _fuse_const_binop(k, untwoc(twoc(x.arg1)), d, a, y.opcode, i + 2)
+                continue
+        if x.opcode == 'param' and x.arg1 == 1:
+            j, srcs = i, []
+            while j < len(body) and body[j].opcode == 'param' and body[j].arg1 == len(srcs) + 1:
+                srcs.append(prep.slot(body[j].arg2))
+                j += 1
+            if j < len(body) and body[j].opcode == 'call' and None not in srcs:
+                code[i] = _fuse_params_call(srcs, code[j], code[i])
+                continue
+        if x.opcode == 'copy' and (i == 0 or body[i - 1].opcode != 'copy'):
+            # the whole run goes in one handler, so that a long run does
+            # not nest one Python call per copy; a jump cannot land inside
+            # the run since jump targets always follow a label
+            j, pairs = i, []
+            while j < len(body) - 1 and body[j].opcode == 'copy':
+                d, a = prep.slot(body[j].dest, write=True), prep.slot(body[j].arg1)
+                if None in (d, a): break
+                pairs.append((d, a))
+                j += 1
+            if pairs:
+                code[i] = _fuse_copies(pairs, code[j])
+
+def prepare(proc, gvars, debug=False, fuse=True):
+    """Decode the body of `proc' into a PreparedProc, resolving its globals
+    in `gvars'. If `debug' is True, every write is validated and reading
+    an unset temporary raises KeyError, as with a TempMap. If `fuse' is
+    False, there is exactly one handler per instruction."""
+    prep = _Preparer(proc, gvars, debug)
+    arg_setters = tuple(prep.setter(t) for t in proc.t_args)
+    body = proc.body
+    code = []
+    for i, instr in enumerate(body):
+        if instr.opcode == 'phi':
+            # a handler for the phis from here to the end of the run
+            j = i + 1
+            while j < len(body) and body[j].opcode == 'phi': j += 1
+            code.append(_decode_phis(body[i:j], prep, j))
+        else:
+            code.append(_decoders[instr.opcode](instr, prep, i + 1))
+    code.append(_fall_off)
+    if fuse and not debug: _fuse(body, code, prep)
+    return PreparedProc(proc, gvars, debug, prep.labels, code,
+                        len(prep.slots) + 1, arg_setters, prep.slots)
+
+_prepared_cache = weakref.WeakKeyDictionary()
+
+def prepare_cached(proc, gvars, debug=False):
+    """Like prepare(), but reuse the PreparedProc from an earlier call for
+    the same Proc object. It is prepared again only if the body list of
+    the proc has been replaced (as cfg.linearize() does), or if `gvars' or
+    `debug' differ. Changes made to the body list in place are not
+    detected."""
+    prep = _prepared_cache.get(proc)
+    if prep is None or prep.body is not proc.body or \
+       prep.gvars is not gvars or prep.debug != debug:
+        prep = _prepared_cache[proc] = prepare(proc, gvars, debug)
+    return prep
+
+def _words(values):
+    """The 64-bit words of the signed `values', for display"""
+    return [v if v is None else twoc(v) for v in values]
+
+def _proc_desc(proc, args):
+    """Describe a call of `proc' with `args' the way execute() does"""
+    values = {t: args[i] for i, t in enumerate(proc.t_args) if t != dummy_temp}
+    return f'{proc.name}({",".join(k + "=" + str(v) for k, v in values.items())})'
+
+class _Machine:
+    """The program and options shared by all frames of execute_prepared()"""
+    def __init__(self, tac_prog, show_proc, only_decimal, debug, output=None):
+        self.gvars, self.procs = tac_prog
+        self.show_proc = show_proc
+        self.only_decimal = only_decimal
+        self.debug = debug
+        self.emit = print if output is None else output.line
+        self.prepared = dict()
+
+    def _prepare(self, proc):
+        return prepare_cached(proc, self.gvars, self.debug)
+
+    def _enter(self, proc_name, args, depth):
+        """Return a frame for a call of `proc_name' with `args'"""
+        prep = self.prepared.get(proc_name)
+        if prep is None:
+            prep = self.prepared[proc_name] = self._prepare(self.procs[proc_name])
+        arg_setters = prep.arg_setters
+        if len(args) < len(arg_setters):
+            raise RuntimeError(f'Bad number of arguments to {proc_name}(): '
+                               f'expected {len(arg_setters)}, got {len(args)}')
+        pool = prep.pool
+        if pool:
+            f = pool.pop()
+            f.regs[:] = prep.init_regs
+        else:
+            f = Frame()
+            f.prep = prep
+            f.regs = prep.init_regs.copy()
+        f.machine = self
+        f.args = args
+        for set_, arg in zip(arg_setters, args):
+            set_(f, arg)
+        f.lab_prev, f.lab_cur = None, proc_name
+        f.params = []
+        f.depth = depth
+        if self.show_proc:
+            self.emit(f'// {"  " * depth}entering {_proc_desc(prep.proc, _words(args))}')
+        return f
+
+    def _leave(self, f, how):
+        """Finish the activation `f' and return its result"""
+        if how == _FALL_OFF:
+            self.emit(f'// {"  " * f.depth}{_proc_desc(f.prep.proc, _words(f.args))} --> NONE')
+        elif self.show_proc:
+            retval, = _words([f.retval])
+            self.emit(f'// {"  " * f.depth}{_proc_desc(f.prep.proc, _words(f.args))} --> {retval}')
+        retval = f.retval
+        # a pooled frame must not keep the machine and its program alive
+        f.machine = f.args = f.params = f.call_args = f.ret_set = None
+        f.prep.pool.append(f)
+        return retval
+
+    def run(self, proc_name, args, depth):
+        """Run `proc_name' on the words `args' and return its result as a
+        word"""
+        retval = self.call(proc_name, [untwoc(a) for a in args], depth)
+        return retval if retval is None else twoc(retval)
+
+    def call(self, proc_name, args, depth):
+        """Run `proc_name' on `args' and return its result"""
+        stack = []
+        f = self._enter(proc_name, args, depth)
+        code, pc = f.prep.code, 0
+        while True:
+            while pc >= 0:
+                pc = code[pc](f)
+            if pc == _CALL:
+                stack.append(f)
+                f = self._enter(f.callee, f.call_args, f.depth + 1)
+                code, pc = f.prep.code, 0
+                continue
+            retval = self._leave(f, pc)
+            if not stack: return retval
+            f = stack.pop()
+            f.ret_set(f, retval)
+            code, pc = f.prep.code, f.pc
+
+# --------------------------------------------------------------------------------
+# Traced execution
+#
+# execute_traced() runs prepared code in which every handler is wrapped in
+# one that appends a record to a TraceRecorder. The records go into a
+# preallocated array that is written out as a binary chunk whenever it is
+# full, so tracing a long run costs little more than the run itself. The
+# text view, like the one show_instr prints, is rendered afterwards from
+# the file by read_trace() (see tactrace.py).
+#
+# Layout, all integers little-endian:
+#   magic b'TACT', then a u32 version
+#   chunks, each a tag byte followed by
+#     b'P'  u32 proc id, u32 length, utf-8 text: the proc name, its
+#           arguments separated by commas, and its instructions, one
+#           per line
+#     b'R'  u32 count, then count records of two i64: key, value
+# The key of a record is (proc id << 35) | (instruction index << 3) | kind,
+# where the kind is one of the _TRACE_* constants below. An instruction
+# that writes a temporary is recorded after it runs, with the value it
+# wrote; any other instruction is recorded before it runs. A call is
+# recorded as ENTER, then an ARG record per argument, and finally a
+# return record.
+
+_TRACE_MAGIC = b'TACT'
+_TRACE_VERSION = 1
+(_TRACE_INSTR, _TRACE_VALUE, _TRACE_ENTER, _TRACE_ARG, _TRACE_ARG_NONE,
+ _TRACE_RET, _TRACE_RET_VALUE, _TRACE_FALL_OFF) = range(8)
+
+def _trace_array(data=b''):
+    arr = array('q')
+    assert arr.itemsize == 8
+    arr.frombytes(data)
+    return arr
+
+class TraceRecorder:
+    """Writer of a binary execution trace to `trace_file'. The records
+    are buffered in an array of `chunk_records' records."""
+
+    def __init__(self, trace_file, chunk_records=1 << 16):
+        self.file = open(trace_file, 'wb')
+        self.file.write(_TRACE_MAGIC + _TRACE_VERSION.to_bytes(4, 'little'))
+        self.buf = _trace_array(bytes(16 * chunk_records))
+        self.pos = 0
+        self.proc_ids = dict()
+
+    def proc_id(self, proc):
+        """The id of `proc', writing its description the first time"""
+        k = self.proc_ids.get(proc)
+        if k is None:
+            k = self.proc_ids[proc] = len(self.proc_ids)
+            text = '\n'.join([proc.name, ','.join(proc.t_args),
+                              *(str(instr) for instr in proc.body)])
+            data = text.encode('utf-8')
+            self.file.write(b'P' + k.to_bytes(4, 'little') +
+                            len(data).to_bytes(4, 'little') + data)
+        return k
+
+    def record(self, key, value):
+        buf, pos = self.buf, self.pos
+        buf[pos] = key
+        buf[pos + 1] = value
+        pos += 2
+        self.pos = pos
+        if pos == len(buf): self.flush()
+
+    def flush(self):
+        if not self.pos: return
+        chunk = self.buf[:self.pos]
+        if sys.byteorder == 'big': chunk.byteswap()
+        self.file.write(b'R' + (self.pos // 2).to_bytes(4, 'little') + chunk.tobytes())
+        self.pos = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+TraceProc = namedtuple('TraceProc', ['name', 't_args', 'instrs'])
+
+def read_trace(trace_file):
+    """Iterate over the records of the trace in `trace_file', as tuples
+    (kind, proc, index, value) where `proc' is a TraceProc and `value' is
+    None if the record has none. The kind is one of 'instr', 'enter',
+    'arg', 'ret' and 'fall_off'."""
+    kinds = {_TRACE_INSTR: 'instr', _TRACE_VALUE: 'instr',
+             _TRACE_ENTER: 'enter', _TRACE_ARG: 'arg', _TRACE_ARG_NONE: 'arg',
+             _TRACE_RET: 'ret', _TRACE_RET_VALUE: 'ret', _TRACE_FALL_OFF: 'fall_off'}
+    with_value = (_TRACE_VALUE, _TRACE_ARG, _TRACE_RET_VALUE)
+    procs = dict()
+    with open(trace_file, 'rb') as f:
+        if f.read(4) != _TRACE_MAGIC:
+            raise RuntimeError(f'{trace_file}: not a TAC trace')
+        version = int.from_bytes(f.read(4), 'little')
+        if version != _TRACE_VERSION:
+            raise RuntimeError(f'{trace_file}: unsupported trace version {version}')
+        while True:
+            tag = f.read(1)
+            if not tag: return
+            if tag == b'P':
+                k = int.from_bytes(f.read(4), 'little')
+                n = int.from_bytes(f.read(4), 'little')
+                name, t_args, *instrs = f.read(n).decode('utf-8').split('\n')
+                procs[k] = TraceProc(name, t_args.split(',') if t_args else [], instrs)
+            elif tag == b'R':
+                n = int.from_bytes(f.read(4), 'little')
+                chunk = _trace_array(f.read(16 * n))
+                if len(chunk) != 2 * n:
+                    raise RuntimeError(f'{trace_file}: truncated trace')
+                if sys.byteorder == 'big': chunk.byteswap()
+                for pos in range(0, len(chunk), 2):
+                    key = chunk[pos]
+                    kind = key & 7
+                    yield (kinds[kind], procs[key >> 35], (key >> 3) & 0xffffffff,
+                           chunk[pos + 1] if kind in with_value else None)
+            else:
+                raise RuntimeError(f'{trace_file}: bad chunk tag {tag!r}')
+
+def _traced(h, record, keys, slots):
+    """Wrap the handler `h' so that it records the instructions `keys',
+    with the values in `slots' when they are not None"""
+    if slots is None:
+        key, = keys
+        def t(f):
+            record(key, 0)
+            return h(f)
+        return t
+    pairs = tuple(zip(keys, slots))
+    def t(f):
+        nxt = h(f)
+        regs = f.regs
+        for key, d in pairs:
+            val = regs[d]
+            if val is None: record(key, 0)
+            else: record(key | _TRACE_VALUE, val)
+        return nxt
+    return t
+
+def prepare_traced(proc, gvars, trace):
+    """Like prepare(), but every handler also records the instructions it
+    performs in `trace', a TraceRecorder"""
+    prep = prepare(proc, gvars, fuse=False)
+    record, pid = trace.record, trace.proc_id(proc)
+    body = proc.body
+    code = []
+    for i, h in enumerate(prep.code):
+        if i == len(body):
+            code.append(h)
+            continue
+        j = i + 1
+        if body[i].opcode == 'phi':
+            while j < len(body) and body[j].opcode == 'phi': j += 1
+        keys = [(pid << 35) | (k << 3) for k in range(i, j)]
+        dests = [body[k].dest for k in range(i, j)]
+        slots = None
+        if body[i].opcode != 'call' and \
+           all(d is not None and d != dummy_temp and d[0] == '%' for d in dests):
+            slots = [prep.slots[d] for d in dests]
+        code.append(_traced(h, record, keys, slots))
+    return PreparedProc(proc, gvars, False, prep.labels, code,
+                        prep.nslots, prep.arg_setters, prep.slots)
+
+class _TracingMachine(_Machine):
+    """A _Machine that runs traced code and records calls and returns"""
+
+    def __init__(self, tac_prog, show_proc, only_decimal, trace, output=None):
+        super().__init__(tac_prog, show_proc, only_decimal, False, output)
+        self.trace = trace
+
+    def _prepare(self, proc):
+        return prepare_traced(proc, self.gvars, self.trace)
+
+    def _enter(self, proc_name, args, depth):
+        f = super()._enter(proc_name, args, depth)
+        record = self.trace.record
+        pid = self.trace.proc_id(f.prep.proc) << 35
+        record(pid | _TRACE_ENTER, 0)
+        for arg in args:
+            if arg is None: record(pid | _TRACE_ARG_NONE, 0)
+            else: record(pid | _TRACE_ARG, arg)
+        return f
+
+    def _leave(self, f, how):
+        pid = self.trace.proc_id(f.prep.proc) << 35
+        if how == _FALL_OFF: self.trace.record(pid | _TRACE_FALL_OFF, 0)
+        elif f.retval is None: self.trace.record(pid | _TRACE_RET, 0)
+        else: self.trace.record(pid | _TRACE_RET_VALUE, f.retval)
+        return super()._leave(f, how)
+
+def execute_traced(tac_prog, proc_name, args, trace=None, **kwargs):
+    """Like execute_prepared(), but record every instruction, call and
+    return in `trace', a TraceRecorder. The values in the trace are
+    signed."""
+    machine = _TracingMachine(tac_prog,
+                              kwargs.get('show_proc', False),
+                              kwargs.get('only_decimal', True),
+                              trace, kwargs.get('output'))
+    try:
+        return machine.run(proc_name, args, kwargs.get('depth', 0))
+    finally:
+        trace.flush()
+
+# --------------------------------------------------------------------------------
+# Memoized execution
+#
+# A proc is pure if its result depends only on its arguments and calling
+# it has no effect: it writes no globals, reads no global that any proc
+# writes, does not print, cannot fall off its end (which prints a
+# message), and only calls procs that are pure too. execute_prepared()
+# with a Memo looks the calls of pure procs up by their argument tuple
+# before running them.
+
+def pure_procs(procs):
+    """Map the name of every pure proc in `procs' to its number of
+    arguments"""
+    written = {instr.dest for proc in procs.values() for instr in proc.body
+               if instr.dest is not None and instr.dest[0] == '@'}
+    callees = dict()
+    for name, proc in procs.items():
+        body = proc.body
+        if not body or body[-1].opcode not in ('ret', 'jmp'): continue
+        calls = set()
+        for instr in body:
+            if instr.dest is not None and instr.dest[0] == '@': break
+            if instr.opcode == 'call':
+                calls.add(instr.arg1)
+                continue
+            operands = [tmp for _, tmp in instr.arg1] if instr.opcode == 'phi' \
+                       else (instr.arg1, instr.arg2)
+            if any(x in written for x in operands if isinstance(x, str)): break
+        else:
+            callees[name] = calls
+    # drop the procs that call impure ones until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        for name, calls in list(callees.items()):
+            if not calls <= callees.keys():
+                del callees[name]
+                changed = True
+    return {name: len(procs[name].t_args) for name in callees}
+
+_NO_RESULT = object()
+
+class Memo:
+    """Bounded LRU cache of the results of pure procs, with statistics.
+    The keys include the Proc, so a Memo can be shared by programs."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        result = self.results.get(key, _NO_RESULT)
+        if result is _NO_RESULT:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.maxsize:
+            self.results.popitem(last=False)
+
+    def __str__(self):
+        return (f'memo: {self.hits} hits, {self.misses} misses, '
+                f'{len(self.results)}/{self.maxsize} entries')
+
+class _MemoMachine(_Machine):
+    """A _Machine that answers calls of pure procs from a Memo"""
+
+    def __init__(self, tac_prog, show_proc, only_decimal, debug, memo, output=None):
+        super().__init__(tac_prog, show_proc, only_decimal, debug, output)
+        self.memo = memo
+        self.pure = pure_procs(self.procs)
+
+    def _key(self, proc_name, args):
+        nargs = self.pure.get(proc_name)
+        if nargs is None or len(args) < nargs: return None
+        return (self.procs[proc_name], tuple(args[:nargs]))
+
+    def call(self, proc_name, args, depth):
+        memo = self.memo
+        key = self._key(proc_name, args)
+        if key is not None:
+            result = memo.get(key)
+            if result is not _NO_RESULT: return result
+        stack = []
+        f = self._enter(proc_name, args, depth)
+        code, pc = f.prep.code, 0
+        while True:
+            while pc >= 0:
+                pc = code[pc](f)
+            if pc == _CALL:
+                callee_key = self._key(f.callee, f.call_args)
+                if callee_key is not None:
+                    result = memo.get(callee_key)
+                    if result is not _NO_RESULT:
+                        f.ret_set(f, result)
+                        pc = f.pc
+                        continue
+                stack.append((f, key))
+                key = callee_key
+                f = self._enter(f.callee, f.call_args, f.depth + 1)
+                code, pc = f.prep.code, 0
+                continue
+            retval = self._leave(f, pc)
+            if key is not None: memo.put(key, retval)
+            if not stack: return retval
+            f, key = stack.pop()
+            f.ret_set(f, retval)
+            code, pc = f.prep.code, f.pc
+
+def execute_prepared(tac_prog, proc_name, args, **kwargs):
+    """Like execute(), but run prepared code instead of interpreting the
+    instructions one by one. Instruction tracing (show_instr) is not
+    supported. With debug=True, values are validated as execute() does.
+    With memo=Memo(), the results of pure procs are memoized, and their
+    memoized calls are not shown by show_proc."""
+    memo = kwargs.get('memo')
+    if memo is not None:
+        machine = _MemoMachine(tac_prog,
+                               kwargs.get('show_proc', False),
+                               kwargs.get('only_decimal', True),
+                               kwargs.get('debug', False), memo,
+                               kwargs.get('output'))
+    else:
+        machine = _Machine(tac_prog,
+                           kwargs.get('show_proc', False),
+                           kwargs.get('only_decimal', True),
+                           kwargs.get('debug', False),
+                           kwargs.get('output'))
+    return machine.run(proc_name, args, kwargs.get('depth', 0))
+
+# --------------------------------------------------------------------------------
+# Profiled execution
+#
+# execute_profiled() runs prepared code in which every handler is wrapped
+# in one that counts it, on a machine that also counts and times the
+# calls. The ordinary prepared code and machine are not touched, so
+# profiling costs nothing when it is off. The count of a block is the
+# count of its first instruction.
+
+class Profile:
+    """Counters filled in by execute_profiled(): per proc, the number of
+    calls, the inclusive and exclusive time in seconds, and the number of
+    times each instruction ran"""
+
+    def __init__(self):
+        self.procs = dict()
+        self.calls = dict()
+        self.inclusive = dict()
+        self.exclusive = dict()
+        self.instr_counts = dict()
+
+    def counters(self, proc):
+        """The instruction counters of `proc', one per instruction"""
+        counts = self.instr_counts.get(proc.name)
+        if counts is None:
+            self.procs[proc.name] = proc
+            counts = self.instr_counts[proc.name] = [0] * (len(proc.body) + 1)
+            self.calls[proc.name] = 0
+            self.inclusive[proc.name] = self.exclusive[proc.name] = 0.0
+        return counts
+
+    def blocks(self, proc_name):
+        """List of (index, labels, count) for the blocks of `proc_name',
+        where `labels' are the labels that lead to the block at `index',
+        or <entry> for the block the proc starts with. A block also starts
+        after every jump and ret, with no labels if none lead to it."""
+        proc, counts = self.procs[proc_name], self.instr_counts[proc_name]
+        body = proc.body
+        starts = {0: ['<entry>']}
+        for lab, i in _resolve_labels(proc).items():
+            starts.setdefault(i, []).append(lab)
+        for i, instr in enumerate(body):
+            if instr.opcode not in jumps and instr.opcode not in ('jmp', 'ret'): continue
+            ni = i + 1
+            while ni < len(body) and body[ni].opcode == 'label': ni += 1
+            if ni < len(body): starts.setdefault(ni, [])
+        return [(i, labs, counts[i]) for i, labs in sorted(starts.items())]
+
+    def as_dict(self):
+        return {name: {'calls': self.calls[name],
+                       'inclusive': self.inclusive[name],
+                       'exclusive': self.exclusive[name],
+                       'blocks': [{'index': i, 'labels': labs, 'count': n}
+                                  for i, labs, n in self.blocks(name)],
+                       'instrs': self.instr_counts[name][:-1]}
+                for name in self.procs}
+
+    def write_json(self, file):
+        json.dump(self.as_dict(), file, indent=2)
+        file.write('\n')
+
+    def report(self, file=None, limit=20):
+        """Write a text report: the procs by exclusive time, then the
+        `limit' most executed blocks and instructions"""
+        file = file or sys.stdout
+        names = sorted(self.procs, key=lambda name: -self.exclusive[name])
+        print(f'{"proc":<24} {"calls":>10} {"inclusive":>12} {"exclusive":>12}', file=file)
+        for name in names:
+            print(f'{name:<24} {self.calls[name]:>10} '
+                  f'{self.inclusive[name]:>12.6f} {self.exclusive[name]:>12.6f}', file=file)
+        blocks = [(n, name, i, labs) for name in names
+                  for i, labs, n in self.blocks(name) if n]
+        blocks.sort(key=lambda b: -b[0])
+        print(f'\n{"count":>12}  block', file=file)
+        for n, name, i, labs in blocks[:limit]:
+            print(f'{n:>12}  {name}:{i} {",".join(labs)}'.rstrip(), file=file)
+        instrs = [(n, name, i) for name in names
+                  for i, n in enumerate(self.instr_counts[name][:-1]) if n]
+        instrs.sort(key=lambda x: -x[0])
+        print(f'\n{"count":>12}  instruction', file=file)
+        for n, name, i in instrs[:limit]:
+            print(f'{n:>12}  {name}:{i}  {str(self.procs[name].body[i]).strip()}', file=file)
+
+def _counted(h, counts, lo, hi):
+    """Wrap the handler `h' so that it counts the instructions lo..hi-1"""
+    if hi == lo + 1:
+        def c(f):
+            counts[lo] += 1
+            return h(f)
+        return c
+    span = range(lo, hi)
+    def c(f):
+        for i in span: counts[i] += 1
+        return h(f)
+    return c
+
+def prepare_profiled(proc, gvars, counts):
+    """Like prepare(), but every handler also counts in `counts' the
+    instructions it performs"""
+    prep = prepare(proc, gvars, fuse=False)
+    body = proc.body
+    code = []
+    for i, h in enumerate(prep.code):
+        j = i + 1
+        if i < len(body) and body[i].opcode == 'phi':
+            while j < len(body) and body[j].opcode == 'phi': j += 1
+        code.append(_counted(h, counts, i, j))
+    return PreparedProc(proc, gvars, False, prep.labels, code,
+                        prep.nslots, prep.arg_setters)
+
+class _ProfilingMachine(_Machine):
+    """A _Machine that runs profiled code and times every call"""
+
+    def __init__(self, tac_prog, show_proc, only_decimal, profile, output=None):
+        super().__init__(tac_prog, show_proc, only_decimal, False, output)
+        self.profile = profile
+        self.clock = time.perf_counter
+        # start time and time spent in callees, per active frame
+        self.timing = []
+        self.active = dict()
+
+    def _prepare(self, proc):
+        return prepare_profiled(proc, self.gvars, self.profile.counters(proc))
+
+    def _enter(self, proc_name, args, depth):
+        f = super()._enter(proc_name, args, depth)
+        self.profile.calls[proc_name] += 1
+        self.active[proc_name] = self.active.get(proc_name, 0) + 1
+        self.timing.append([self.clock(), 0.0])
+        return f
+
+    def _leave(self, f, how):
+        start, in_callees = self.timing.pop()
+        elapsed = self.clock() - start
+        name = f.prep.proc.name
+        profile = self.profile
+        profile.exclusive[name] += elapsed - in_callees
+        self.active[name] -= 1
+        # only the outermost activation of a recursive proc adds to its
+        # inclusive time
+        if self.active[name] == 0: profile.inclusive[name] += elapsed
+        if self.timing: self.timing[-1][1] += elapsed
+        return super()._leave(f, how)
+
+def execute_profiled(tac_prog, proc_name, args, profile=None, **kwargs):
+    """Like execute_prepared(), but collect the counters and timings of the
+    run in `profile', a Profile"""
+    if profile is None: profile = Profile()
+    machine = _ProfilingMachine(tac_prog,
+                                kwargs.get('show_proc', False),
+                                kwargs.get('only_decimal', True),
+                                profile, kwargs.get('output'))
+    return machine.run(proc_name, args, kwargs.get('depth', 0))
+
+# --------------------------------------------------------------------------------
+# Compiled execution
+#
+# compile_proc() translates a Proc into the source of a Python function,
+# P_<name>, whose temporaries are local variables. The body is split into
+# blocks at the jump targets, and each block is a state of a loop that
+# dispatches on the state number with a balanced tree of comparisons.
+# Globals are G_<name> and calls are direct calls of the other P_<name>
+# functions, all looked up in a namespace built for each execution. The
+# compiled code object depends on nothing but the Proc, so it is cached
+# per Proc like prepared code.
+
+_MASK = '0xffffffffffffffff'
+
+_py_binops = {
+    'add': '({} + {}) & ' + _MASK,
+    'sub': '({} - {}) & ' + _MASK,
+    'mul': '({} * {}) & ' + _MASK,
+    'and': '{} & {}',
+    'or':  '{} | {}',
+    'xor': '{} ^ {}',
+    # these have to round and shift exactly as binops does
+    'div': 'B_div({}, {})',
+    'mod': 'B_mod({}, {})',
+    'shl': 'B_shl({}, {})',
+    'shr': 'B_shr({}, {})',
+}
+_py_unops = {
+    'neg': '-{} & ' + _MASK,
+    'not': '~{} & ' + _MASK,
+}
+_py_jumps = {
+    'jz':  '{} == 0',
+    'jnz': '{} != 0',
+    'jl':  '{} >> 63',
+    'jle': '{0} == 0 or {0} >> 63',
+}
+
+def _static_params(body):
+    """Whether every call in `body' is preceded, in the same straight-line
+    run, by `param 1' ... `param k', in order, so that the params can be
+    kept in local variables"""
+    pending = 0
+    for instr in body:
+        if instr.opcode == 'param':
+            if instr.arg1 != pending + 1: return False
+            pending += 1
+        elif instr.opcode == 'call':
+            pending = 0
+        elif pending and (instr.opcode in jumps or
+                          instr.opcode in ('label', 'jmp', 'ret', 'phi')):
+            return False
+    return True
+
+class _PyGen:
+    """Generator of the Python source for one Proc"""
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.body = proc.body
+        self.labels = _resolve_labels(proc)
+        self.static_params = _static_params(self.body)
+        self.track_labels = any(instr.opcode == 'phi' for instr in self.body)
+        self.names = dict()
+        self.states = {k: n for n, k in
+                       enumerate(sorted({0, *self.labels.values()}))}
+        self.lines = []
+        self.falls_off = False
+
+    def local(self, tmp):
+        name = self.names.get(tmp)
+        if name is None: name = self.names[tmp] = f't{len(self.names)}'
+        return name
+
+    def rd(self, x):
+        if x == dummy_temp: return '0'
+        if x[0] == '@': return f'G_{x[1:]}.value'
+        return self.local(x)
+
+    def wr(self, x):
+        if x == dummy_temp: return '_'
+        if x[0] == '@': return f'G_{x[1:]}.value'
+        return self.local(x)
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def goto(self, ind, lab):
+        if self.track_labels: self.emit(ind, f'prev, cur = cur, {lab!r}')
+        self.emit(ind, f's = {self.states[self.labels[lab]]}')
+        self.emit(ind, 'continue')
+
+    def gen_phis(self, ind, phis):
+        sources = []
+        for phi in phis:
+            srcs = dict()
+            for lab, tmp in phi.arg1: srcs.setdefault(lab, tmp)
+            sources.append(srcs)
+        preds = [lab for lab in sources[0] if all(lab in srcs for srcs in sources)]
+        dests = ', '.join(self.wr(phi.dest) for phi in phis)
+        kw = 'if'
+        for lab in preds:
+            self.emit(ind, f'{kw} prev == {lab!r}:')
+            self.emit(ind + 1, f'{dests} = {", ".join(self.rd(srcs[lab]) for srcs in sources)}')
+            kw = 'elif'
+        self.emit(ind, 'else:' if preds else 'if True:')
+        for phi in phis:
+            self.emit(ind + 1, f'if prev not in {tuple(lab for lab, _ in phi.arg1)!r}:')
+            self.emit(ind + 2, f'raise RuntimeError(f"cannot resolve phi: came from {{prev}}, "')
+            self.emit(ind + 2, f'                   {"can only handle [" + ",".join(lab for lab, _ in phi.arg1) + "]"!r})')
+
+    def gen_call(self, ind, instr, pending):
+        callee, nargs = instr.arg1, instr.arg2
+        if self.static_params:
+            if pending < nargs:
+                self.emit(ind, f'raise RuntimeError({f"Bad number of arguments to {callee}(): expected {nargs}, got {pending}"!r})')
+                return
+            args = ', '.join(f'p{k}' for k in range(1, pending + 1))
+        else:
+            self.emit(ind, f'if len(P) < {nargs}:')
+            self.emit(ind + 1, f'raise RuntimeError(f"Bad number of arguments to {callee}(): "')
+            self.emit(ind + 1, f'                   f"expected {nargs}, got {{len(P)}}")')
+            args = '*P'
+        if callee.startswith('@__bx_print'):
+            if callee not in ('@__bx_print_int', '@__bx_print_bool'):
+                self.emit(ind, f'raise RuntimeError({f"Unknown print() specialization: {callee}"!r})')
+                return
+            if self.static_params and pending != 1:
+                self.emit(ind, f'raise RuntimeError({f"Bad number of arguments to print(): expected 1, got {pending}"!r})')
+                return
+            if not self.static_params:
+                self.emit(ind, 'if len(P) != 1:')
+                self.emit(ind + 1, 'raise RuntimeError(f"Bad number of arguments to print(): "')
+                self.emit(ind + 1, '                   f"expected 1, got {len(P)}")')
+            self.emit(ind, f'{callee[6:]}({args})')
+        elif instr.dest == dummy_temp:
+            self.emit(ind, f'P_{callee[1:]}({args})')
+        else:
+            self.emit(ind, f'{self.wr(instr.dest)} = P_{callee[1:]}({args})')
+        if not self.static_params: self.emit(ind, 'P = []')
+
+    def gen_state(self, ind, start):
+        """Generate the code that runs from index `start' until a jump, a
+        return, or the start of the next state"""
+        body = self.body
+        i, pending = start, 0
+        while True:
+            if i == len(body):
+                self.falls_off = True
+                self.emit(ind, f'return _fall_off({self.proc.name!r}, A)')
+                return
+            if i != start and i in self.states:
+                self.emit(ind, f's = {self.states[i]}')
+                return
+            instr = body[i]
+            op = instr.opcode
+            i += 1
+            if op == 'nop':
+                pass
+            elif op == 'label':
+                if self.track_labels: self.emit(ind, f'prev, cur = cur, {instr.arg1!r}')
+            elif op == 'phi':
+                j = i
+                while j < len(body) and body[j].opcode == 'phi': j += 1
+                self.gen_phis(ind, body[i-1:j])
+                i = j
+            elif op == 'jmp':
+                if instr.arg1 not in self.labels:
+                    self.emit(ind, f'raise RuntimeError({f"Unknown jump destination {instr.arg1}"!r})')
+                else:
+                    self.goto(ind, instr.arg1)
+                return
+            elif op in jumps:
+                if instr.arg2 not in self.labels:
+                    self.emit(ind, f'raise RuntimeError({f"Unknown jump destination {instr.arg2}"!r})')
+                    return
+                self.emit(ind, f'if {_py_jumps[op].format(self.rd(instr.arg1))}:')
+                self.goto(ind + 1, instr.arg2)
+            elif op == 'const':
+                self.emit(ind, f'{self.wr(instr.dest)} = {twoc(instr.arg1)}')
+            elif op == 'copy':
+                self.emit(ind, f'{self.wr(instr.dest)} = {self.rd(instr.arg1)}')
+            elif op == 'param':
+                if self.static_params:
+                    pending += 1
+                    self.emit(ind, f'p{pending} = {self.rd(instr.arg2)}')
+                else:
+                    self.emit(ind, f'_param(P, {instr.arg1!r}, {self.rd(instr.arg2)})')
+            elif op == 'call':
+                self.gen_call(ind, instr, pending)
+                pending = 0
+            elif op == 'ret':
+                self.emit(ind, 'return None' if instr.arg1 == dummy_temp else
+                               f'return {self.rd(instr.arg1)}')
+                return
+            elif op in binops:
+                self.emit(ind, f'{self.wr(instr.dest)} = '
+                               f'{_py_binops[op].format(self.rd(instr.arg1), self.rd(instr.arg2))}')
+            else:
+                self.emit(ind, f'{self.wr(instr.dest)} = {_py_unops[op].format(self.rd(instr.arg1))}')
+
+    def gen_dispatch(self, ind, lo, hi, starts):
+        """Dispatch on s among the states lo..hi-1"""
+        if hi - lo == 1:
+            self.gen_state(ind, starts[lo])
+            return
+        mid = (lo + hi) // 2
+        self.emit(ind, f'if s < {mid}:')
+        self.gen_dispatch(ind + 1, lo, mid, starts)
+        self.emit(ind, 'else:')
+        self.gen_dispatch(ind + 1, mid, hi, starts)
+
+    def generate(self):
+        formals = self.proc.t_args
+        starts = sorted(self.states)
+        self.gen_dispatch(2, 0, len(starts), starts)
+        body, self.lines = self.lines, []
+        plain = len(set(formals)) == len(formals) and \
+                all(t != dummy_temp and t[0] == '%' for t in formals)
+        if plain:
+            params = ', '.join([*(self.wr(t) for t in formals), '*_'])
+            self.emit(0, f'def P_{self.proc.name[1:]}({params}):')
+            if self.falls_off:
+                self.emit(1, f'A = ({"".join(self.wr(t) + ", " for t in formals)})')
+        else:
+            self.emit(0, f'def P_{self.proc.name[1:]}(*A):')
+            for k, t in enumerate(formals):
+                self.emit(1, f'{self.wr(t)} = A[{k}]')
+        if not self.static_params: self.emit(1, 'P = []')
+        if self.track_labels: self.emit(1, f'prev, cur = None, {self.proc.name!r}')
+        self.emit(1, 's = 0')
+        self.emit(1, 'while True:')
+        self.lines.extend(body)
+        return '\n'.join(self.lines) + '\n'
+
+def proc_source(proc):
+    """Return the Python source that compile_proc() compiles for `proc'"""
+    return _PyGen(proc).generate()
+
+_compiled_cache = weakref.WeakKeyDictionary()
+
+def compile_proc(proc):
+    """Return the code object that defines the Python function for `proc'.
+    It is cached until the body list of the proc is replaced."""
+    entry = _compiled_cache.get(proc)
+    if entry is None or entry[0] is not proc.body:
+        code = compile(proc_source(proc), f'<tac {proc.name}>', 'exec')
+        entry = _compiled_cache[proc] = (proc.body, code)
+    return entry[1]
+
+def _compiled_depth(frame):
+    """How many compiled TAC procs are active at `frame'"""
+    depth = 0
+    while frame is not None:
+        if frame.f_code.co_filename.startswith('<tac '): depth += 1
+        frame = frame.f_back
+    return depth
+
+def execute_compiled(tac_prog, proc_name, args, **kwargs):
+    """Like execute(), but compile every proc to a Python function and
+    call that. Tracing (show_proc, show_instr) is not supported, and TAC
+    recursion is bounded by the Python recursion limit."""
+    gvars, procs = tac_prog
+    only_decimal = kwargs.get('only_decimal', True)
+    depth = kwargs.get('depth', 0)
+    output = kwargs.get('output')
+    emit = print if output is None else output.line
+    def print_int(u):
+        if only_decimal: emit(str(untwoc(u)))
+        else: emit(f'{untwoc(u): 20d}  0x{u:016x}  0b{u:064b}')
+    def print_bool(u):
+        emit('false' if u == 0 else 'true')
+    def param(params, k, val):
+        if not isinstance(k, int) or k < 1:
+            emit(f'Bad argument to param: '
+                  f'expecting int >= 1, got {k}')
+        # make params big enough to hold k items
+        for _ in range(k - len(params)):
+            params.append(None)
+        params[k - 1] = val
+    def fall_off(name, args):
+        indent = '  ' * (depth + _compiled_depth(sys._getframe(1)) - 1)
+        emit(f'// {indent}{_proc_desc(procs[name], args)} --> NONE')
+    ns = {'B_div': binops['div'], 'B_mod': binops['mod'],
+          'B_shl': binops['shl'], 'B_shr': binops['shr'],
+          'print_int': print_int, 'print_bool': print_bool,
+          '_param': param, '_fall_off': fall_off}
+    for name, gvar in gvars.items(): ns[f'G_{name[1:]}'] = gvar
+    for proc in procs.values(): exec(compile_proc(proc), ns)
+    return ns[f'P_{proc_name[1:]}'](*args)
+
+# --------------------------------------------------------------------------------
+# Batched execution
+#
+# execute_batch() runs one proc on many argument vectors at once. Every
+# temporary holds a NumPy int64 vector with one lane per argument vector,
+# and each instruction is evaluated for all the lanes that reach it. The
+# lanes are scheduled a block at a time: lanes that take different
+# branches wait at the start of their next block, and the waiting block
+# with the lowest index runs next, so lanes that diverge in an if or a
+# loop run together again after it.
+
+# operands of div and mod beyond this are rounded by the float division in
+# binops, so those lanes are computed with binops itself
+_BATCH_EXACT = 1 << 53
+
+def _batch_divmod(op, a, b, mask):
+    if (b[mask] == 0).any():
+        raise ZeroDivisionError('integer division or modulo by zero')
+    big = mask & ((a >= _BATCH_EXACT) | (a <= -_BATCH_EXACT) |
+                  (b >= _BATCH_EXACT) | (b <= -_BATCH_EXACT))
+    safe = ~mask | big
+    sa = np.where(safe, 0, a)
+    sb = np.where(safe, 1, b)
+    q = sa // sb
+    q += (q < 0) & (q * sb != sa)       # round towards zero like int()
+    r = q if op == 'div' else sa - sb * q
+    for k in np.flatnonzero(big):
+        r[k] = untwoc(binops[op](twoc(int(a[k])), twoc(int(b[k]))))
+    return r
+
+def _batch_shift(op, a, b, mask):
+    if (b[mask] < 0).any():
+        raise ValueError('negative shift count')
+    c = np.clip(b, 0, 63)
+    if op == 'shl': return np.where(b < 64, a << c, 0)
+    return a >> c
+
+_batch_binops = {
+    'add': lambda a, b, m: a + b,
+    'sub': lambda a, b, m: a - b,
+    'mul': lambda a, b, m: a * b,
+    'and': lambda a, b, m: a & b,
+    'or':  lambda a, b, m: a | b,
+    'xor': lambda a, b, m: a ^ b,
+    'div': lambda a, b, m: _batch_divmod('div', a, b, m),
+    'mod': lambda a, b, m: _batch_divmod('mod', a, b, m),
+    'shl': lambda a, b, m: _batch_shift('shl', a, b, m),
+    'shr': lambda a, b, m: _batch_shift('shr', a, b, m),
+}
+_batch_unops = {
+    'neg': lambda a: -a,
+    'not': lambda a: ~a,
+}
+_batch_jumps = {
+    'jz':  lambda a: a == 0,
+    'jnz': lambda a: a != 0,
+    'jl':  lambda a: a < 0,
+    'jle': lambda a: a <= 0,
+}
+
+class _Batch:
+    """State shared by all the procs run for one execute_batch()"""
+
+    def __init__(self, tac_prog, nlanes, only_decimal, output=None):
+        gvars, self.procs = tac_prog
+        self.nlanes = nlanes
+        self.only_decimal = only_decimal
+        self.emit = print if output is None else output.line
+        # every lane gets its own copy of the globals
+        self.gvars = {name: np.full(nlanes, untwoc(twoc(gvar.value)), dtype=np.int64)
+                      for name, gvar in gvars.items()}
+        self.zero = np.zeros(nlanes, dtype=np.int64)
+        self.labels = dict()
+        self.depth = 0
+
+    def print_lanes(self, callee, vals, mask):
+        for k in np.flatnonzero(mask):
+            x = int(vals[k])
+            if callee == '@__bx_print_bool':
+                self.emit('false' if x == 0 else 'true')
+            elif self.only_decimal:
+                self.emit(str(x))
+            else:
+                u = twoc(x)
+                self.emit(f'{x: 20d}  0x{u:016x}  0b{u:064b}')
+
+    def fall_off(self, proc, args, mask):
+        indent = '  ' * self.depth
+        for k in np.flatnonzero(mask):
+            desc = _proc_desc(proc, [twoc(int(a[k])) for a in args])
+            self.emit(f'// {indent}{desc} --> NONE')
+
+    def call(self, proc_name, args, mask):
+        """Run `proc_name' on the lanes selected by `mask' and return the
+        vector of their results"""
+        proc = self.procs[proc_name]
+        body = proc.body
+        if len(args) < len(proc.t_args):
+            raise RuntimeError(f'Bad number of arguments to {proc_name}(): '
+                               f'expected {len(proc.t_args)}, got {len(args)}')
+        labels = self.labels.get(proc)
+        if labels is None: labels = self.labels[proc] = _resolve_labels(proc)
+        label_ids = {lab: k for k, lab in enumerate(labels, 1)}
+        # as in execute(), control comes from the proc name at the first label
+        label_ids[proc_name] = 0
+        starts = set(labels.values())
+        track = any(instr.opcode == 'phi' for instr in body)
+        if track:
+            prev = np.full(self.nlanes, -1, dtype=np.int32)
+            cur = np.zeros(self.nlanes, dtype=np.int32)
+        vals = dict()
+        gvars = self.gvars
+
+        def rd(x):
+            if x == dummy_temp: return self.zero
+            if x[0] == '@': return gvars[x]
+            vec = vals.get(x)
+            if vec is None:
+                raise RuntimeError(f'Unset temporary {x} in {proc_name}')
+            return vec
+
+        def wr(x, vec, m):
+            if x == dummy_temp: return
+            store = gvars if x[0] == '@' else vals
+            old = store.get(x)
+            store[x] = vec if old is None or m.all() else np.where(m, vec, old)
+
+        def enter(lab, m):
+            if track:
+                prev[m] = cur[m]
+                cur[m] = label_ids[lab]
+
+        for t, vec in zip(proc.t_args, args): wr(t, vec, mask)
+        result = self.zero.copy()
+        params = []
+        pending = {0: mask}
+        while pending:
+            start = min(pending)
+            m = pending.pop(start)
+            i = start
+            while True:
+                if i == len(body):
+                    # these lanes fell off the end: result 0
+                    self.fall_off(proc, args, m)
+                    break
+                if i != start and i in starts:
+                    pending[i] = pending[i] | m if i in pending else m
+                    break
+                instr = body[i]
+                op = instr.opcode
+                i += 1
+                if op == 'nop':
+                    pass
+                elif op == 'label':
+                    enter(instr.arg1, m)
+                elif op == 'phi':
+                    j = i
+                    while j < len(body) and body[j].opcode == 'phi': j += 1
+                    phis = body[i-1:j]
+                    i = j
+                    news = [(phi.dest, np.zeros(self.nlanes, dtype=np.int64))
+                            for phi in phis]
+                    done = np.zeros(self.nlanes, dtype=bool)
+                    for (dest, new), phi in zip(news, phis):
+                        got = np.zeros(self.nlanes, dtype=bool)
+                        for lab, tmp in reversed(phi.arg1):
+                            if lab not in label_ids: continue
+                            pm = m & (prev == label_ids[lab])
+                            if pm.any():
+                                new[pm] = rd(tmp)[pm]
+                                got |= pm
+                        if not got[m].all():
+                            raise RuntimeError(f'cannot resolve phi in {proc_name}: '
+                                               f'came from an unlisted label')
+                    for dest, new in news: wr(dest, new, m)
+                elif op == 'jmp':
+                    if instr.arg1 not in labels:
+                        raise RuntimeError(f'Unknown jump destination {instr.arg1}')
+                    enter(instr.arg1, m)
+                    k = labels[instr.arg1]
+                    pending[k] = pending[k] | m if k in pending else m
+                    break
+                elif op in jumps:
+                    if instr.arg2 not in labels:
+                        raise RuntimeError(f'Unknown jump destination {instr.arg2}')
+                    taken = m & _batch_jumps[op](rd(instr.arg1))
+                    if taken.any():
+                        enter(instr.arg2, taken)
+                        k = labels[instr.arg2]
+                        pending[k] = pending[k] | taken if k in pending else taken
+                        m = m & ~taken
+                        if not m.any(): break
+                elif op == 'const':
+                    wr(instr.dest, np.full(self.nlanes, untwoc(twoc(instr.arg1)),
+                                           dtype=np.int64), m)
+                elif op == 'copy':
+                    wr(instr.dest, rd(instr.arg1), m)
+                elif op in binops:
+                    wr(instr.dest, _batch_binops[op](rd(instr.arg1), rd(instr.arg2), m), m)
+                elif op in unops:
+                    wr(instr.dest, _batch_unops[op](rd(instr.arg1)), m)
+                elif op == 'param':
+                    k = instr.arg1
+                    params.extend(self.zero for _ in range(k - len(params)))
+                    params[k - 1] = np.where(m, rd(instr.arg2), params[k - 1])
+                elif op == 'call':
+                    callee, nargs = instr.arg1, instr.arg2
+                    if len(params) < nargs:
+                        raise RuntimeError(f'Bad number of arguments to {callee}(): '
+                                           f'expected {nargs}, got {len(params)}')
+                    if callee.startswith('@__bx_print'):
+                        if callee not in ('@__bx_print_int', '@__bx_print_bool'):
+                            raise RuntimeError(f'Unknown print() specialization: {callee}')
+                        self.print_lanes(callee, params[0], m)
+                    else:
+                        self.depth += 1
+                        wr(instr.dest, self.call(callee, params, m), m)
+                        self.depth -= 1
+                    params = []
+                elif op == 'ret':
+                    result = np.where(m, rd(instr.arg1), result)
+                    break
+        return result
+
+def execute_batch(tac_prog, proc_name, arg_matrix, **kwargs):
+    """Run `proc_name' once for every row of `arg_matrix', all at the
+    same time, and return the list of results, one per row.
+
+    The rows run as lanes of NumPy vectors and do not share globals. The
+    lines printed by the rows are printed in row order at every print
+    call, and a row that falls off the end of a proc prints the line of
+    execute() and returns 0. An error
+    in any row stops the whole batch."""
+    if np is None:
+        raise RuntimeError('execute_batch() needs NumPy')
+    rows = [[untwoc(twoc(x)) for x in row] for row in arg_matrix]
+    if not rows: return []
+    nargs = len(rows[0])
+    if any(len(row) != nargs for row in rows):
+        raise RuntimeError('Every row of the argument matrix needs the same length')
+    batch = _Batch(tac_prog, len(rows), kwargs.get('only_decimal', True),
+                   kwargs.get('output'))
+    matrix = np.array(rows, dtype=np.int64).reshape(len(rows), nargs)
+    args = [matrix[:, k].copy() for k in range(nargs)]
+    result = batch.call(proc_name, args, np.ones(len(rows), dtype=bool))
+    return [twoc(int(x)) for x in result]
+
+# --------------------------------------------------------------------------------
+# Batch runs
+#
+# run_batch() runs many (file, proc, args) jobs on a pool of worker
+# processes. A worker parses each file once and keeps the program, and
+# before every run it puts the globals back to their initial values,
+# since running a program updates its Gvars in place. Running on the same
+# Gvar objects also keeps the prepared code of the program valid.
+
+class _JobTimeout(Exception):
+    pass
+
+# the programs a worker has loaded: path -> (mtime, (gvars, procs), initial values)
+_batch_programs = dict()
+
+def _batch_program(tac_file):
+    mtime = os.stat(tac_file).st_mtime
+    entry = _batch_programs.get(tac_file)
+    if entry is None or entry[0] != mtime:
+        gvars, procs = dict(), dict()
+        for tlv in load_tac(tac_file):
+            if tlv.name in gvars or tlv.name in procs:
+                raise RuntimeError(f'Repeated definition of {tlv.name}')
+            if isinstance(tlv, Proc): procs[tlv.name] = tlv
+            else: gvars[tlv.name] = tlv
+        entry = (mtime, (gvars, procs), [gvar.value for gvar in gvars.values()])
+        _batch_programs[tac_file] = entry
+    _, tac_prog, initial = entry
+    for gvar, value in zip(tac_prog[0].values(), initial): gvar.value = value
+    return tac_prog
+
+def _batch_alarm(signum, frame):
+    raise _JobTimeout()
+
+def _batch_init(timeout):
+    """Set up a worker process to stop a job after `timeout' seconds"""
+    import signal
+    global _batch_timeout
+    _batch_timeout = timeout
+    if timeout: signal.signal(signal.SIGALRM, _batch_alarm)
+
+def _batch_job(job):
+    """Run one job in a worker and return (failed, its JSON record)"""
+    import signal
+    k, (tac_file, proc_name, args) = job
+    record = dict(job=k, file=tac_file, proc=proc_name, args=args,
+                  result=None, output='', error=None)
+    output = Output(capture=True)
+    try:
+        if _batch_timeout: signal.setitimer(signal.ITIMER_REAL, _batch_timeout)
+        try:
+            tac_prog = _batch_program(tac_file)
+            result = execute_prepared(tac_prog, proc_name, [twoc(a) for a in args],
+                                      output=output)
+        finally:
+            if _batch_timeout: signal.setitimer(signal.ITIMER_REAL, 0)
+        record['result'] = result if result is None else untwoc(result)
+    except _JobTimeout:
+        record['error'] = f'timeout after {_batch_timeout} s'
+    except (Exception, SystemExit) as exc:
+        record['error'] = f'{type(exc).__name__}: {exc}'
+    record['output'] = output.getvalue()
+    return record['error'] is not None, json.dumps(record)
+
+_batch_timeout = None
+
+def read_manifest(manifest):
+    """Read the jobs in `manifest', one JSON object per line with the keys
+    `file', `proc' (default @main) and `args' (default [])"""
+    jobs = []
+    with open(manifest) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip(): continue
+            try:
+                job = json.loads(line)
+                jobs.append((job['file'], job.get('proc', '@main'),
+                             [int(a) for a in job.get('args', ())]))
+            except (ValueError, KeyError, TypeError) as exc:
+                raise RuntimeError(f'{manifest}:{lineno}: bad job: {exc}')
+    return jobs
+
+def run_batch(jobs, workers=None, timeout=None, file=None):
+    """Run `jobs', a list of (tac_file, proc_name, args), on a pool of
+    `workers' processes, and write one JSON line per job to `file' in
+    the order of `jobs'. The args and the result are signed ints. Returns
+    the number of jobs that failed."""
+    import multiprocessing
+    file = file or sys.stdout
+    failed = 0
+    with multiprocessing.Pool(workers, initializer=_batch_init,
+                              initargs=(timeout,)) as pool:
+        for job_failed, line in pool.imap(_batch_job, enumerate(jobs), chunksize=16):
+            failed += job_failed
+            file.write(line + '\n')
+    return failed
 
 # --------------------------------------------------------------------------------
 
 lexer = None
+fast_lexer = None
 parser = None
+_init_lock = threading.Lock()
+
+def _init_parser():
+    """Create the module-level `lexer', `fast_lexer' and `parser' on first use"""
+    global lexer, fast_lexer, parser
+    with _init_lock:
+        if lexer is None: lexer = __create_lexer()
+        if fast_lexer is None: fast_lexer = __create_fast_lexer()
+        if parser is None: parser = __create_parser()
+
+def new_session(fast=False):
+    """Create a ParseSession for TAC, with a FastLexer if `fast' is True.
+    The module-level `lexer', `fast_lexer' and `parser' serve only as
+    prototypes, so any number of sessions can be used concurrently."""
+    _init_parser()
+    return ParseSession(fast_lexer if fast else lexer, parser)
+
+def load_tac(tac_file, fast=False, mapped=False):
+    """Load the TAC instructions from the given `tac_file'.
+    If `fast' is True, tokenize with the FastLexer instead of PLY.
+    If `mapped' is True, the FastLexer scans a memory map of the file.
+    Files ending in .tacb are read with load_tacb(). Every call uses a
+    session of its own, so it is safe to call from several threads."""
+    if tac_file.endswith('.tacb'): return load_tacb(tac_file)
+    session = new_session(fast or mapped)
+    if fast or mapped:
+        session.lexer.load_source(tac_file, mapped=mapped)
+        if hasattr(session.parser, 'parse_tokens'):
+            return session.parser.parse_tokens(session.lexer.raw_tokens(),
+                                               lexer=session.lexer)
+    else:
+        session.lexer.load_source(tac_file)
+    return session.parser.parse(lexer=session.lexer)
+
+class _DeclTokens:
+    """Token stream for a single top-level declaration. Iteration (and
+    token()) stops just before the next `var' or `proc' token, which is
+    kept in `boundary' so that parsing can resume from it."""
+    def __init__(self, first, tokens, kind):
+        self.first = first
+        self.tokens = tokens
+        self.kind = kind
+        self.boundary = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.first is not None:
+            tok, self.first = self.first, None
+            return tok
+        tok = next(self.tokens)
+        if self.kind(tok) in ('VAR', 'PROC'):
+            self.boundary = tok
+            raise StopIteration
+        return tok
+
+    def token(self):
+        return next(self, None)
+
+def _lexer_tokens(ply_lexer):
+    """Tokens of `ply_lexer', each with its `lexer' set for error reporting"""
+    for tok in iter(ply_lexer.token, None):
+        tok.lexer = ply_lexer
+        yield tok
+
+def stream_tac(tac_file, fast=False, mapped=False):
+    """Generate the Gvar and Proc declarations of the given `tac_file' one at
+    a time, each as soon as it has been parsed. Unlike load_tac(), the
+    program list is never built, so a declaration can be released as soon
+    as the caller is done with it. `fast' and `mapped' are as for
+    load_tac(). Files ending in .tacb are read with stream_tacb()."""
+    if tac_file.endswith('.tacb'):
+        yield from stream_tacb(tac_file)
+        return
+    session = new_session(fast or mapped)
+    if fast or mapped:
+        session.lexer.load_source(tac_file, mapped=mapped)
+        if hasattr(session.parser, 'parse_tokens'):
+            tokens = session.lexer.raw_tokens()
+            kind = itemgetter(0)
+            to_token = lambda tok: Token(*tok, session.lexer)
+            parse = lambda decl: session.parser.parse_tokens(decl, lexer=session.lexer)
+        else:
+            tokens = iter(session.lexer.token, None)
+            kind = attrgetter('type')
+            to_token = lambda tok: tok
+            parse = lambda decl: session.parser.parse(lexer=decl)
+    else:
+        session.lexer.load_source(tac_file)
+        tokens = _lexer_tokens(session.lexer)
+        kind = attrgetter('type')
+        to_token = lambda tok: tok
+        parse = lambda decl: session.parser.parse(lexer=decl)
+    tok = next(tokens, None)
+    while tok is not None:
+        decl = _DeclTokens(tok, tokens, kind)
+        try:
+            tlvs = parse(decl)
+        except RuntimeError:
+            if decl.boundary is None: raise
+            tlvs = None
+        if tlvs is None:
+            # a declaration that ends early is a syntax error at the
+            # boundary, reported outside the handler so that it is not
+            # chained to the error of the truncated declaration
+            session.parser.errorfunc(to_token(decl.boundary))
+            return
+        yield from tlvs
+        tok = decl.boundary
 
-if '__file__' in globals():
-    lexer  = __create_lexer()
-    parser = __create_parser()
-
-def load_tac(tac_file):
-    """Load the TAC instructions from the given `tac_file'"""
-    lexer.load_source(tac_file)
-    return parser.parse(lexer=lexer)
+# --------------------------------------------------------------------------------
+# Binary TAC (.tacb)
+#
+# Layout, all integers little-endian:
+#   magic b'TACB', then a u32 version
+#   seven sections, each a u32 count followed by an array:
+#     opcode names        'u32 length + bytes' records, packed as a u32 array
+#                         of lengths followed by the utf-8 bytes
+#     string table        same packing as the opcode names
+#     declarations        u64: 0, name, kind, value             (Gvar)
+#                              1, name, #args, args..., #instrs (Proc)
+#     instruction opcodes u8 index into the opcode names
+#     operand kinds       u8, three per instruction (dest, arg1, arg2)
+#     operand values      u64, three per instruction
+#     phi arguments       u64: #pairs, label, temp, label, temp, ...
+# Operand kinds are the _TACB_* constants below; strings are stored as
+# indices into the string table, so each temporary or label is stored once.
+
+_TACB_MAGIC = b'TACB'
+_TACB_VERSION = 1
+_TACB_NONE, _TACB_STR, _TACB_INT, _TACB_NEGINT, _TACB_PHI = range(5)
+_tacb_opcodes = tuple(sorted(opcodes))
+
+def _tacb_array(typecode, data=()):
+    arr = array(typecode, data)
+    assert arr.itemsize == {'B': 1, 'I': 4, 'Q': 8}[typecode]
+    return arr
+
+def _tacb_pack_strings(strs):
+    encoded = [s.encode('utf-8') for s in strs]
+    lengths = _tacb_array('I', (len(b) for b in encoded))
+    if sys.byteorder == 'big': lengths.byteswap()
+    return lengths.tobytes() + b''.join(encoded)
+
+def dump_tacb(tlvs, tacb_file):
+    """Write the Gvar and Proc declarations `tlvs' to `tacb_file' in the
+    binary TAC format, which load_tacb() can read back without parsing"""
+    strings, strtab = [], {}
+    def intern(s):
+        k = strtab.get(s)
+        if k is None:
+            k = strtab[s] = len(strings)
+            strings.append(s)
+        return k
+    opindex = {op: k for k, op in enumerate(_tacb_opcodes)}
+    decls = _tacb_array('Q')
+    ops, kinds, values, phis = (_tacb_array(t) for t in 'BBQQ')
+    def encode(x):
+        if x is None: return _TACB_NONE, 0
+        if isinstance(x, str): return _TACB_STR, intern(x)
+        if isinstance(x, int):
+            return (_TACB_INT, x) if x >= 0 else (_TACB_NEGINT, -x)
+        k = len(phis)
+        phis.append(len(x))
+        for lab, tmp in x:
+            phis.append(intern(lab)); phis.append(intern(tmp))
+        return _TACB_PHI, k
+    for tlv in tlvs:
+        if isinstance(tlv, Gvar):
+            decls.extend((0, intern(tlv.name), *encode(tlv.value)))
+        else:
+            decls.extend((1, intern(tlv.name), len(tlv.t_args)))
+            decls.extend(intern(t) for t in tlv.t_args)
+            decls.append(len(tlv.body))
+            for instr in tlv.body:
+                ops.append(opindex[instr.opcode])
+                for x in (instr.dest, instr.arg1, instr.arg2):
+                    k, v = encode(x)
+                    kinds.append(k); values.append(v)
+    with open(tacb_file, 'wb') as f:
+        f.write(_TACB_MAGIC)
+        f.write(_TACB_VERSION.to_bytes(4, 'little'))
+        for count, data in ((len(_tacb_opcodes), _tacb_pack_strings(_tacb_opcodes)),
+                            (len(strings), _tacb_pack_strings(strings)),
+                            (len(decls), decls), (len(ops), ops),
+                            (len(kinds), kinds), (len(values), values),
+                            (len(phis), phis)):
+            if isinstance(data, array) and sys.byteorder == 'big': data.byteswap()
+            f.write(count.to_bytes(4, 'little'))
+            f.write(data)
+
+def stream_tacb(tacb_file):
+    """Generate the Gvar and Proc declarations stored in `tacb_file'"""
+    with open(tacb_file, 'rb') as f:
+        buf = memoryview(f.read())
+    if buf[:4] != _TACB_MAGIC:
+        raise ValueError(f'{tacb_file}: not a binary TAC file')
+    version = int.from_bytes(buf[4:8], 'little')
+    if version != _TACB_VERSION:
+        raise ValueError(f'{tacb_file}: unsupported binary TAC version {version}')
+    pos = 8
+    def section(typecode):
+        nonlocal pos
+        count = int.from_bytes(buf[pos:pos+4], 'little')
+        arr = _tacb_array(typecode)
+        end = pos + 4 + count * arr.itemsize
+        arr.frombytes(buf[pos+4:end])
+        if sys.byteorder == 'big': arr.byteswap()
+        pos = end
+        return arr
+    def strings():
+        nonlocal pos
+        lengths = section('I')
+        strs = []
+        for n in lengths:
+            strs.append(str(buf[pos:pos+n], 'utf-8'))
+            pos += n
+        return strs
+    opnames = strings()
+    strs = strings()
+    decls, ops, kinds, values, phis = (section(t) for t in 'QBBQQ')
+    def operand(kind, value):
+        if kind == _TACB_STR: return strs[value]
+        if kind == _TACB_INT: return value
+        if kind == _TACB_NEGINT: return -value
+        if kind == _TACB_PHI:
+            n = phis[value]
+            return tuple((strs[phis[j]], strs[phis[j+1]])
+                         for j in range(value + 1, value + 1 + 2 * n, 2))
+        return None
+    new_instr = Instr.__new__
+    d = i = 0
+    while d < len(decls):
+        if decls[d] == 0:
+            yield Gvar(strs[decls[d+1]], operand(decls[d+2], decls[d+3]))
+            d += 4
+            continue
+        name, nargs = strs[decls[d+1]], decls[d+2]
+        formals = [strs[k] for k in decls[d+3:d+3+nargs]]
+        ninstrs = decls[d+3+nargs]
+        d += 4 + nargs
+        body = []
+        first, i = i, i + ninstrs
+        for k in range(first, i):
+            # the instructions were checked when they were created
+            instr = new_instr(Instr)
+            instr.opcode = opnames[ops[k]]
+            j = 3 * k
+            instr.dest = operand(kinds[j], values[j])
+            instr.arg1 = operand(kinds[j+1], values[j+1])
+            instr.arg2 = operand(kinds[j+2], values[j+2])
+            body.append(instr)
+        yield Proc(name, formals, body)
+
+def load_tacb(tacb_file):
+    """Load the TAC declarations from the binary TAC file `tacb_file'"""
+    return list(stream_tacb(tacb_file))
 
 if __name__ == '__main__':
     from argparse import ArgumentParser
@@ -525,26 +2820,96 @@ if __name__ == '__main__':
     ap.add_argument('files', metavar='FILE', type=str, nargs='*', help='A TAC file')
     ap.add_argument('-v', dest='verbosity', default=0, action='count',
                     help='increase verbosity')
+    ap.add_argument('--engine', dest='engine', choices=('interp', 'prepared', 'compiled'),
+                    default='interp',
+                    help='How to run the program: interpret each instruction '
+                         '(default), run prepared code, or compile each proc to '
+                         'a Python function; compiled procs run as prepared code '
+                         'with -v, and -vv always interprets')
+    ap.add_argument('--debug', dest='debug', action='store_true', default=False,
+                    help='Validate every value written by prepared code')
+    ap.add_argument('--memo', dest='memo', metavar='SIZE', type=int, default=None,
+                    help='Memoize pure procs in an LRU cache of SIZE results '
+                         '(--engine prepared only); the statistics go to stderr')
+    ap.add_argument('--profile', dest='profile', metavar='OUT', default=None,
+                    help='Profile the run and write the report to OUT '
+                         '(as JSON if OUT ends in .json, - for stdout)')
+    ap.add_argument('--batch', dest='batch', metavar='MANIFEST', default=None,
+                    help='Run the jobs in MANIFEST, a JSON object per line with '
+                         'file, proc and args, and print a JSON line per job')
+    ap.add_argument('-j', dest='workers', metavar='N', type=int, default=None,
+                    help='Number of worker processes for --batch (default: one per CPU)')
+    ap.add_argument('--timeout', dest='timeout', metavar='SECONDS', type=float,
+                    default=None, help='Stop a --batch job after SECONDS')
+    ap.add_argument('--trace', dest='trace', metavar='OUT', default=None,
+                    help='Record a binary trace of the run in OUT (see tactrace.py)')
     ap.add_argument('--no-exec', dest='execute', action='store_false',
                     default=True, help='Do not run the interpreter')
+    ap.add_argument('--fast-lexer', dest='fast_lexer', action='store_true',
+                    default=False, help='Tokenize with the single-regex FastLexer')
+    ap.add_argument('--mmap', dest='mapped', action='store_true',
+                    default=False, help='Memory-map each FILE and scan it with the FastLexer')
+    ap.add_argument('--build-parser', dest='build_parser', action='store_true',
+                    default=False, help='Generate the standalone parser module tac_lr.py')
+    ap.add_argument('--tacb', dest='tacb', action='store_true',
+                    default=False, help='Write each FILE in binary TAC format to FILE.tacb')
     args = ap.parse_args()
+    if args.memo is not None and (args.engine != 'prepared' or args.profile or args.trace
+                                  or args.verbosity > 1):
+        ap.error('--memo needs --engine prepared, and cannot be used with '
+                 '--profile, --trace or -vv')
+    if args.build_parser:
+        parser = __create_parser(rebuild=True)
+    if args.batch:
+        jobs = read_manifest(args.batch)
+        failed = run_batch(jobs, args.workers, args.timeout)
+        if failed: print(f'{failed} of {len(jobs)} jobs failed', file=sys.stderr)
+        sys.exit(1 if failed else 0)
+    output = Output(sys.stdout)
     kwargs = dict(show_proc = args.verbosity > 0,
                   show_instr = args.verbosity > 1,
-                  only_decimal = args.verbosity <= 2)
+                  only_decimal = args.verbosity <= 2,
+                  output = output)
     for srcfile in args.files:
         # lexer.load_source(srcfile)
         # print(*lexer, sep='\n')
         gvars, procs = dict(), dict()
         seen = set()
-        for tlv in load_tac(srcfile):
+        for tlv in stream_tac(srcfile, fast=args.fast_lexer, mapped=args.mapped):
             if tlv.name in seen:
                 raise RuntimeError(f'Repeated definition of {tlv.name}')
             seen.add(tlv.name)
             if isinstance(tlv, Proc): procs[tlv.name] = tlv
             else: gvars[tlv.name] = tlv
         tac_prog = (gvars, procs)
-        if args.execute:
-            execute(tac_prog, '@main', (), **kwargs)
-        elif args.verbosity > 0:
-            for gvar in gvars.values(): print(gvar)
-            for proc in procs.values(): print(proc)
+        if args.tacb:
+            tacbfile = (srcfile[:-4] if srcfile.endswith('.tac') else srcfile) + '.tacb'
+            dump_tacb([*gvars.values(), *procs.values()], tacbfile)
+        if not args.execute:
+            if args.verbosity > 0:
+                for gvar in gvars.values(): print(gvar)
+                for proc in procs.values(): print(proc)
+            continue
+        memo = None if args.memo is None else Memo(args.memo)
+        try:
+            if args.profile:
+                profile = Profile()
+                execute_profiled(tac_prog, '@main', (), profile=profile, **kwargs)
+            elif args.trace:
+                with TraceRecorder(args.trace) as trace:
+                    execute_traced(tac_prog, '@main', (), trace=trace, **kwargs)
+            elif args.engine == 'interp' or kwargs['show_instr']:
+                execute(tac_prog, '@main', (), **kwargs)
+            elif args.engine == 'compiled' and not kwargs['show_proc']:
+                execute_compiled(tac_prog, '@main', (), **kwargs)
+            else:
+                execute_prepared(tac_prog, '@main', (), debug=args.debug, memo=memo, **kwargs)
+        finally:
+            output.flush()
+        if args.profile:
+            write = profile.write_json if args.profile.endswith('.json') else profile.report
+            if args.profile == '-': write(sys.stdout)
+            else:
+                with open(args.profile, 'w') as out: write(out)
+        elif memo is not None:
+            print(f'// {memo}', file=sys.stderr)
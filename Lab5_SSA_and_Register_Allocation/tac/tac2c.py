@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+
+"""
+Translation from TAC to portable C
+
+Every temporary is an int64_t local, labels are C labels, and a phi run
+is a switch on the label that control came from, where the proc name is
+the label of the entry, as in the interpreter. Arithmetic wraps like
+tac.binops does. A proc that falls off its end prints the same
+"--> NONE" line as the interpreter and returns 0 where the interpreter
+returns None, and a call with fewer pending params than the callee takes
+stops the program as it does in the interpreter. The one difference from
+the interpreter is that div and mod are exact in C while tac.binops goes
+through float division, so the two only agree on operands of magnitude
+below 2**53.
+"""
+
+import tac, subprocess, sys, os
+
+c_binop = { 'add': '+', 'sub': '-', 'mul': '*', 'and': '&', 'or': '|', 'xor': '^' }
+c_helper = { 'div': 'bx_div', 'mod': 'bx_mod', 'shl': 'bx_shl', 'shr': 'bx_shr' }
+c_jump = { 'jz': '{} == 0', 'jnz': '{} != 0', 'jl': '{} < 0', 'jle': '{} <= 0' }
+
+prelude = r'''#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <inttypes.h>
+
+static void bx_fail(const char *msg)
+{
+  fflush(stdout);
+  fprintf(stderr, "RuntimeError: %s\n", msg);
+  exit(1);
+}
+
+static inline int64_t bx_div(int64_t a, int64_t b)
+{
+  if (b == 0) bx_fail("division by zero");
+  return b == -1 ? (int64_t)(0 - (uint64_t)a) : a / b;
+}
+
+static inline int64_t bx_mod(int64_t a, int64_t b)
+{
+  if (b == 0) bx_fail("division by zero");
+  return b == -1 ? 0 : a % b;
+}
+
+static inline int64_t bx_shl(int64_t a, int64_t b)
+{
+  if (b < 0) bx_fail("negative shift count");
+  return b >= 64 ? 0 : (int64_t)((uint64_t)a << b);
+}
+
+static inline int64_t bx_shr(int64_t a, int64_t b)
+{
+  if (b < 0) bx_fail("negative shift count");
+  return b >= 64 ? (a < 0 ? -1 : 0) : a >> b;
+}
+
+static void bx_print_int(int64_t x)
+{
+  printf("%" PRId64 "\n", x);
+}
+
+static void bx_print_bool(int64_t x)
+{
+  puts(x == 0 ? "false" : "true");
+}
+'''
+
+def c_int(value):
+    """C expression for the 64-bit word `value'"""
+    value = tac.untwoc(tac.twoc(value))
+    if value == -1 << 63: return 'INT64_MIN'
+    return f'INT64_C({value})'
+
+class Cgen:
+    """Translation of a TAC program to C"""
+
+    def __init__(self, gvars, procs):
+        self.gvars = gvars
+        self.procs = procs
+        self.results = []
+
+    def emit(self, line):
+        self.results.append(line)
+
+    def program(self):
+        self.emit(prelude)
+        # the call depth is only needed to indent the fall-off line
+        self.track_depth = any(self._falls_off(proc) for proc in self.procs.values())
+        if self.track_depth:
+            self.emit('static int bx_depth;')
+        for gvar in self.gvars.values():
+            self.emit(f'static int64_t G_{gvar.name[1:]} = {c_int(gvar.value)};')
+        for proc in self.procs.values():
+            self.emit(f'static int64_t {self._signature(proc)};')
+        for proc in self.procs.values():
+            self.emit('')
+            self._proc(proc)
+        self.emit('')
+        self.emit('int main(void)')
+        self.emit('{')
+        self.emit('  P_main();')
+        self.emit('  return 0;')
+        self.emit('}')
+        return '\n'.join(self.results) + '\n'
+
+    def _signature(self, proc):
+        params = ', '.join(f'int64_t a{k}' for k in range(len(proc.t_args))) or 'void'
+        return f'P_{proc.name[1:]}({params})'
+
+    def _falls_off(self, proc):
+        body = proc.body
+        return not body or body[-1].opcode not in ('ret', 'jmp') or \
+            len(body) in tac._resolve_labels(proc).values()
+
+    def _covered(self, body, i):
+        """Are the params of the call at `i' all set just before it?"""
+        callee = body[i].arg1
+        if callee.startswith('@__bx_print'):
+            # print takes exactly one param
+            n = 1
+            if i > 1 and body[i - 2].opcode == 'param': return False
+        elif callee in self.procs:
+            n = len(self.procs[callee].t_args)
+        else:
+            return True
+        if i < n: return False
+        return all(body[i - n + k].opcode == 'param' and body[i - n + k].arg1 == k + 1
+                   for k in range(n))
+
+    def _proc(self, proc):
+        self.temps = dict()
+        self.labels = tac._resolve_labels(proc)
+        self.label_ids = {lab: k for k, lab in enumerate(self.labels, 1)}
+        # the entry, as the label that control comes from at the first label
+        self.label_ids[proc.name] = 0
+        self.track = any(instr.opcode == 'phi' for instr in proc.body)
+        calls = [i for i, instr in enumerate(proc.body) if instr.opcode == 'call']
+        self.count_params = not all(self._covered(proc.body, i) for i in calls)
+        # the landing site of every label, where all its C labels go
+        landing = dict()
+        for lab, i in self.labels.items(): landing.setdefault(i, []).append(lab)
+        nparams = max((instr.arg1 for instr in proc.body
+                       if instr.opcode == 'param'), default=0)
+        nparams = max([nparams, *(len(self.procs[instr.arg1].t_args)
+                                  for instr in proc.body
+                                  if instr.opcode == 'call' and instr.arg1 in self.procs)])
+        body, self.results = self.results, []
+        if self.track_depth: self.emit('  bx_depth++;')
+        for k, t in enumerate(proc.t_args):
+            if t != tac.dummy_temp: self.emit(f'  {self._wr(t)} = a{k};')
+        i = 0
+        while i < len(proc.body):
+            for lab in landing.get(i, ()): self.emit(f' {self._clabel(lab)}:;')
+            instr = proc.body[i]
+            if instr.opcode == 'phi':
+                j = i
+                while j < len(proc.body) and proc.body[j].opcode == 'phi': j += 1
+                self._phis(proc.body[i:j])
+                i = j
+                continue
+            self._instr(instr, proc, i)
+            i += 1
+        for lab in landing.get(len(proc.body), ()): self.emit(f' {self._clabel(lab)}:;')
+        if self._falls_off(proc):
+            self._fall_off(proc)
+        self.emit('  return 0;')
+        code, self.results = self.results, body
+        self.emit(f'static int64_t {self._signature(proc)}')
+        self.emit('{')
+        if self.temps:
+            self.emit(f'  int64_t {", ".join(f"{n} = 0" for n in self.temps.values())};')
+        self.emit('  int64_t _;')
+        if nparams:
+            self.emit(f'  int64_t prm[{nparams}];')
+        if self.count_params:
+            self.emit('  int np = 0;')
+        if self.track:
+            self.emit('  int prev = -1, cur = 0;')
+        self.results.extend(code)
+        self.emit('}')
+
+    def _fall_off(self, proc):
+        """Print the line of tac.execute() for a proc that falls off"""
+        self.emit('  fputs("// ", stdout);')
+        self.emit('  for (int k = 1; k < bx_depth; k++) fputs("  ", stdout);')
+        args = [(t, k) for k, t in enumerate(proc.t_args) if t != tac.dummy_temp]
+        fmt = ','.join(f'{t.replace("%", "%%")}=%" PRIu64 "' for t, _ in args)
+        values = ''.join(f', (uint64_t)a{k}' for _, k in args)
+        self.emit(f'  printf("{proc.name}({fmt}) --> NONE\\n"{values});')
+        self.emit('  bx_depth--;')
+
+    def _clabel(self, lab):
+        return f'lab_{self.label_ids[lab]}'
+
+    def _local(self, tmp):
+        name = self.temps.get(tmp)
+        if name is None: name = self.temps[tmp] = f't{len(self.temps)}'
+        return name
+
+    def _rd(self, x):
+        if x == tac.dummy_temp: return 'INT64_C(0)'
+        if x[0] == '@': return f'G_{x[1:]}'
+        return self._local(x)
+
+    def _wr(self, x):
+        if x == tac.dummy_temp: return '_'
+        if x[0] == '@': return f'G_{x[1:]}'
+        return self._local(x)
+
+    def _goto(self, lab):
+        if lab not in self.labels:
+            return f'bx_fail("Unknown jump destination {lab}");'
+        if self.track:
+            return f'{{ prev = cur; cur = {self.label_ids[lab]}; goto {self._clabel(lab)}; }}'
+        return f'goto {self._clabel(lab)};'
+
+    def _phis(self, phis):
+        sources = []
+        for phi in phis:
+            srcs = dict()
+            for lab, tmp in phi.arg1: srcs.setdefault(lab, tmp)
+            sources.append(srcs)
+        preds = [lab for lab in sources[0] if all(lab in srcs for srcs in sources)]
+        self.emit('  switch (prev) {')
+        for lab in preds:
+            if lab not in self.label_ids: continue
+            self.emit(f'  case {self.label_ids[lab]}: {{')
+            for k, srcs in enumerate(sources):
+                self.emit(f'    int64_t n{k} = {self._rd(srcs[lab])};')
+            for k, phi in enumerate(phis):
+                self.emit(f'    {self._wr(phi.dest)} = n{k};')
+            self.emit('    break;')
+            self.emit('  }')
+        self.emit('  default: bx_fail("cannot resolve phi");')
+        self.emit('  }')
+
+    def _instr(self, instr, proc, i):
+        op = instr.opcode
+        if op == 'nop':
+            pass
+
+        elif op == 'label':
+            if self.track:
+                self.emit(f'  prev = cur; cur = {self.label_ids[instr.arg1]};')
+
+        elif op == 'const':
+            self.emit(f'  {self._wr(instr.dest)} = {c_int(instr.arg1)};')
+
+        elif op == 'copy':
+            self.emit(f'  {self._wr(instr.dest)} = {self._rd(instr.arg1)};')
+
+        elif op in c_binop:
+            self.emit(f'  {self._wr(instr.dest)} = (int64_t)((uint64_t){self._rd(instr.arg1)} '
+                      f'{c_binop[op]} (uint64_t){self._rd(instr.arg2)});')
+
+        elif op in c_helper:
+            self.emit(f'  {self._wr(instr.dest)} = {c_helper[op]}'
+                      f'({self._rd(instr.arg1)}, {self._rd(instr.arg2)});')
+
+        elif op == 'neg':
+            self.emit(f'  {self._wr(instr.dest)} = (int64_t)(0 - (uint64_t){self._rd(instr.arg1)});')
+
+        elif op == 'not':
+            self.emit(f'  {self._wr(instr.dest)} = ~{self._rd(instr.arg1)};')
+
+        elif op == 'jmp':
+            self.emit(f'  {self._goto(instr.arg1)}')
+
+        elif op in c_jump:
+            self.emit(f'  if ({c_jump[op].format(self._rd(instr.arg1))}) {self._goto(instr.arg2)}')
+
+        elif op == 'param':
+            self.emit(f'  prm[{instr.arg1 - 1}] = {self._rd(instr.arg2)};')
+            if self.count_params:
+                self.emit(f'  if (np < {instr.arg1}) np = {instr.arg1};')
+
+        elif op == 'call':
+            callee = instr.arg1
+            covered = self._covered(proc.body, i)
+            if self.count_params:
+                check = 'np != 1' if callee.startswith('@__bx_print') else \
+                        f'np < {len(self.procs[callee].t_args)}' if callee in self.procs else None
+                if check and not covered:
+                    name = 'print' if callee.startswith('@__bx_print') else callee
+                    self.emit(f'  if ({check}) bx_fail("Bad number of arguments to {name}()");')
+                self.emit('  np = 0;')
+            if callee in ('@__bx_print_int', '@__bx_print_bool'):
+                call = f'{callee[3:]}(prm[0])'
+                self.emit(f'  {call};')
+                return
+            if callee not in self.procs:
+                raise RuntimeError(f'Cgen: unknown procedure {callee} called from {proc.name}')
+            arity = len(self.procs[callee].t_args)
+            call = f'P_{callee[1:]}({", ".join(f"prm[{k}]" for k in range(arity))})'
+            if instr.dest == tac.dummy_temp: self.emit(f'  {call};')
+            else: self.emit(f'  {self._wr(instr.dest)} = {call};')
+
+        elif op == 'ret':
+            if self.track_depth: self.emit('  bx_depth--;')
+            self.emit(f'  return {self._rd(instr.arg1)};')
+
+        else:
+            raise RuntimeError(f'Cgen: cannot handle TAC opcode {op}')
+
+def generate(tac_file, gcc=True):
+    """Write the C translation of `tac_file' next to it and, if `gcc', build
+    it with gcc -O2. Returns the list of files written."""
+    gvars, procs = dict(), dict()
+    for tlv in tac.load_tac(tac_file):
+        if isinstance(tlv, tac.Proc): procs[tlv.name] = tlv
+        else: gvars[tlv.name] = tlv
+    if '@main' not in procs:
+        raise RuntimeError(f'{tac_file}: no @main procedure')
+    c_file = os.path.splitext(tac_file)[0] + '.c'
+    with open(c_file, 'w') as f:
+        f.write(Cgen(gvars, procs).program())
+    out_files = [c_file]
+    if gcc:
+        exe_file = os.path.splitext(tac_file)[0] + '.exe'
+        cmd = ["gcc", "-O2", "-o", exe_file, c_file]
+        result = subprocess.run(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(f'Failed to run: {" ".join(cmd)}')
+        out_files.append(exe_file)
+    return out_files
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    ap = ArgumentParser(description='Translate TAC to C, build it with gcc, and run it')
+    ap.add_argument('files', metavar='FILE', type=str, nargs='+', help='A TAC file')
+    ap.add_argument('--no-exec', dest='execute', action='store_false',
+                    default=True, help='Only write FILE.c and FILE.exe')
+    ap.add_argument('--no-gcc', dest='gcc', action='store_false',
+                    default=True, help='Only write FILE.c')
+    args = ap.parse_args()
+    status = 0
+    for tac_file in args.files:
+        out_files = generate(tac_file, gcc=args.gcc)
+        if args.gcc and args.execute:
+            sys.stdout.flush()
+            status |= subprocess.run([os.path.abspath(out_files[-1])]).returncode
+    sys.exit(status)
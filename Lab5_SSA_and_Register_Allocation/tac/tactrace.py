@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Viewer for the binary execution traces written by tac.py --trace
+"""
+
+import tac, sys
+
+def _desc(proc, args):
+    """Describe a call the way tac.execute() does"""
+    values = [f'{t}={"None" if a is None else tac.twoc(a)}'
+              for t, a in zip(proc.t_args, args) if t != tac.dummy_temp]
+    return f'{proc.name}({",".join(values)})'
+
+def render(trace_file, file=None, limit=None, only_decimal=True):
+    """Write the text view of the trace in `trace_file' to `file', in the
+    format of tac.py -vv, followed on each instruction by the value it
+    wrote. Stops after `limit' lines if it is not None."""
+    file = file or sys.stdout
+    def show(x):
+        return str(x) if only_decimal else f'{x}  0x{tac.twoc(x):016x}'
+    calls = []          # (proc, args) of the active calls
+    pending = None      # the call whose arguments are being read
+    lines = 0
+    for kind, proc, index, value in tac.read_trace(trace_file):
+        if kind == 'arg':
+            pending[1].append(value)
+            continue
+        if pending is not None:
+            print(f'// {"  " * len(calls)}entering {_desc(*pending)}', file=file)
+            calls.append(pending)
+            lines += 1
+            pending = None
+        if limit is not None and lines >= limit: return
+        indent = '  ' * (len(calls) - 1)
+        if kind == 'enter':
+            pending = (proc, [])
+            continue
+        if kind == 'instr':
+            # numbered like tac.execute(), which prints pc+1 after the increment
+            line = f'// {indent}[{index + 2: 4d}] {proc.instrs[index]}'
+            if value is not None: line += f'  --> {show(value)}'
+            print(line, file=file)
+        else:
+            retval = 'NONE' if kind == 'fall_off' else \
+                     'None' if value is None else tac.twoc(value)
+            print(f'// {indent}{_desc(*calls.pop())} --> {retval}', file=file)
+        lines += 1
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    ap = ArgumentParser(description='Render a binary TAC execution trace as text')
+    ap.add_argument('trace', metavar='TRACE', type=str, help='A trace written by tac.py --trace')
+    ap.add_argument('-n', dest='limit', metavar='N', type=int, default=None,
+                    help='Only render the first N lines')
+    ap.add_argument('-x', dest='hex', action='store_true', default=False,
+                    help='Also show values as 64-bit words in hex')
+    args = ap.parse_args()
+    try:
+        render(args.trace, limit=args.limit, only_decimal=not args.hex)
+    except BrokenPipeError:
+        pass